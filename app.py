@@ -1,9 +1,17 @@
-from flask import Flask, render_template, url_for
-from db import db_session
+import json
+import queue
+from flask import Flask, render_template, url_for, request, jsonify, abort, \
+    Response
+from db import db_session, Session
 from models import Game
 from sqlalchemy import func
+import matchups
+import search
+import notify
 
 app = Flask(__name__)
+# Pushes live games' updates to their streams, from a single listening thread
+game_updates = notify.GameUpdates(Session)
 
 @app.teardown_appcontext
 def shutdown_session(exception=None):
@@ -20,6 +28,67 @@ def game_details(game_id):
     game = db_session.query(Game).filter(Game.game_id == game_id).first()
     return render_template('game_details.html', game=game)
 
+@app.route('/game_details/<game_id>/stream')
+def game_stream(game_id):
+    # Server-sent events with the game's score and new at-bats each time it's
+    # loaded, and a comment every 15 seconds to keep the connection open
+    def events():
+        updates = game_updates.subscribe(game_id)
+        try:
+            while True:
+                try:
+                    update = updates.get(timeout=15)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield 'data: {}\n\n'.format(json.dumps(update))
+        finally:
+            game_updates.unsubscribe(game_id, updates)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+@app.route('/heatmap/<role>/<int:player_id>/<int:season>')
+def heatmap(role, player_id, season):
+    # Imported here, as only this view needs NumPy
+    import heatmaps
+    if role not in heatmaps.ROLES:
+        abort(404)
+    pitch_type = request.args.get('pitch_type')
+    stands = request.args.get('stands')
+    counts, pitches = heatmaps.get_grid(db_session, role, player_id, season,
+                                        pitch_type=pitch_type, stands=stands)
+    return jsonify(role=role, player_id=player_id, season=season,
+                   pitch_type=pitch_type, stands=stands, pitches=pitches,
+                   x_range=heatmaps.X_RANGE, y_range=heatmaps.Y_RANGE,
+                   counts=counts.tolist())
+
+@app.route('/matchup/<int:batter_id>/<int:pitcher_id>')
+def matchup(batter_id, pitcher_id):
+    result = matchups.get_matchup(db_session, batter_id, pitcher_id)
+    return jsonify(batter_id=batter_id, pitcher_id=pitcher_id, **result)
+
+@app.route('/search')
+def search_plays():
+    q = request.args.get('q', '')
+    kind = request.args.get('kind', 'at_bats')
+    if not q.strip() or kind not in search.SEARCHABLE:
+        abort(400)
+    after = request.args.get('after')
+    try:
+        after = search.parse_cursor(after) if after else None
+    except ValueError:
+        abort(400)
+    per_page = request.args.get('per_page', 25, type=int)
+    plays, after = search.search_plays(db_session, q, kind=kind, after=after,
+                                       per_page=per_page)
+    for play in plays:
+        play['game_date'] = play['game_date'].isoformat()
+    # Pass next as the after parameter to get the next page
+    return jsonify(q=q, kind=kind, plays=plays,
+                   next=search.format_cursor(after) if after else None)
+
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    # Threaded, so open streams don't block other requests
+    app.run(debug=True, threaded=True)
@@ -0,0 +1,329 @@
+"""Storage backends.
+
+The schema in models.py is shared by every backend. What differs is how an
+engine is created and how rows are bulk-written with upsert semantics:
+
+    PostgreSQL: multi-row INSERT ... ON CONFLICT DO UPDATE, through
+        psycopg2's execute_values
+    SQLite: executemany of INSERT OR REPLACE, for tests and small loads
+    DuckDB: multi-row INSERT OR REPLACE, for columnar, analytical use on a
+        laptop. Requires the duckdb_engine package. DuckDB allows a single
+        writing process, so load with one worker (or eagerly).
+
+Rows that combine existing and new values (e.g., counts that are added to)
+are written with Backend.merge, an INSERT ... ON CONFLICT DO UPDATE with
+expressions of both rows. PostgreSQL, SQLite (3.24 or later) and DuckDB all
+support it. Tables whose info has a 'merge' entry (Backend.merge's keyword
+arguments) are always upserted that way, e.g., to only replace a row with a
+more recent one.
+
+The backend is picked from the database URL, e.g.:
+
+    BREAKINGBALL_DB_URL=sqlite:///breakingball.db
+    BREAKINGBALL_DB_URL=duckdb:///breakingball.duckdb
+
+"""
+
+import sqlalchemy
+from sqlalchemy import event, func, and_, or_, literal_column
+from sqlalchemy.engine.url import make_url
+
+
+def _chunks(rows, size):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def _as_dicts(table, rows):
+    names = [c.name for c in table.columns]
+    return [dict(zip(names, row)) for row in rows]
+
+
+def _merge_sql(connection, table, assignments, where, values):
+    # INSERT ... ON CONFLICT DO UPDATE of Backend.merge, with values as the
+    # VALUES placeholder
+    preparer = connection.dialect.identifier_preparer
+    names = {'old': preparer.format_table(table), 'new': 'EXCLUDED'}
+    sql = 'INSERT INTO {} ({}) VALUES {} ON CONFLICT ({}) DO UPDATE SET {}' \
+        .format(preparer.format_table(table),
+                ', '.join(preparer.quote(c.name) for c in table.columns),
+                values,
+                ', '.join(preparer.quote(c.name)
+                          for c in table.primary_key.columns),
+                ', '.join('{} = {}'.format(preparer.quote(c.name),
+                                           assignments[c.name].format(**names))
+                          for c in table.columns if c.name in assignments))
+    if where is not None:
+        sql += ' WHERE ' + where.format(**names)
+    return sql
+
+
+def _sorted_by_key(table, rows):
+    # Write rows in primary key order, so concurrent writers lock them in the
+    # same order
+    key_indexes = [i for i, c in enumerate(table.columns) if c.primary_key]
+    return sorted(rows, key=lambda row: tuple(row[i] for i in key_indexes))
+
+
+def _unique(table, rows):
+    # A multi-row upsert can't affect the same row twice, so keep only the
+    # last row for each primary key
+    key_indexes = [i for i, c in enumerate(table.columns) if c.primary_key]
+    by_key = {}
+    for row in rows:
+        by_key[tuple(row[i] for i in key_indexes)] = row
+    return list(by_key.values())
+
+
+class Backend(object):
+    """Default backend: per-row executemany of a plain INSERT."""
+
+    name = None
+    # Maximum number of rows per multi-row INSERT statement
+    chunk_size = 500
+
+    def create_engine(self, url, **kwargs):
+        return sqlalchemy.create_engine(url, **kwargs)
+
+    def insert_statement(self, table, update=True):
+        return table.insert()
+
+    def upsert(self, connection, table, rows, update=None):
+        """Insert rows into table, replacing existing rows with the same
+        primary key.
+
+        Args:
+            connection: SQLAlchemy connection (e.g., session.connection(), to
+                write within the session's transaction)
+            table: SQLAlchemy Table
+            rows: List of tuples with a value for every column of the
+                table, in the order of table.columns
+            update: Replace existing rows? If False, rows with an existing
+                primary key are skipped. Defaults to True, or, for tables
+                with a 'merge' entry in their info, to updating existing
+                rows with merge.
+
+        """
+        if not rows:
+            return
+        if update is None and 'merge' in table.info:
+            self.merge(connection, table, rows, **table.info['merge'])
+        else:
+            self.insert(connection, table, rows, update is not False)
+
+    def insert(self, connection, table, rows, update):
+        # Write rows with upsert's semantics, replacing existing rows if
+        # update is True, otherwise skipping them
+        connection.execute(self.insert_statement(table, update),
+                           _as_dicts(table, rows))
+
+    def merge(self, connection, table, rows, assignments, where=None):
+        """Insert rows into table, updating existing rows with the same
+        primary key with expressions of their existing and inserted values.
+
+        Args:
+            connection: SQLAlchemy connection
+            table: SQLAlchemy Table
+            rows: List of tuples with a value for every column of the
+                table, in the order of table.columns. Rows with the same
+                primary key are collapsed, keeping the last.
+            assignments: Dictionary of column names and SQL expressions of
+                their updated values, in which {old} and {new} stand for the
+                existing and inserted rows, e.g., '{old}.n + {new}.n' to add
+                counts
+            where: SQL condition, in the same terms, for updating an existing
+                row. Defaults to always.
+
+        """
+        if not rows:
+            return
+        params = [sqlalchemy.bindparam('p{}'.format(i), type_=c.type)
+                  for i, c in enumerate(table.columns)]
+        sql = _merge_sql(connection, table, assignments, where, '({})'.format(
+            ', '.join(':' + p.key for p in params)))
+        connection.execute(
+            sqlalchemy.text(sql).bindparams(*params),
+            [dict(('p{}'.format(i), value) for i, value in enumerate(row))
+             for row in _sorted_by_key(table, _unique(table, rows))])
+
+    def lock_rows(self, query):
+        # Lock the rows selected by an ORM query until the end of the
+        # transaction, if the backend supports it
+        return query
+
+    def text_search(self, columns, q):
+        """Clause matching rows whose text columns contain every word of q.
+        By default, a case-insensitive LIKE of each word, which scans the
+        table."""
+        clauses = []
+        for word in q.split():
+            pattern = '%{}%'.format(word.replace('\\', '\\\\')
+                                    .replace('%', '\\%').replace('_', '\\_'))
+            clauses.append(or_(*[c.ilike(pattern, escape='\\')
+                                 for c in columns]))
+        return and_(*clauses)
+
+    def text_search_indexes(self, table, columns):
+        # DDL of the indexes speeding up text_search, if the backend has any
+        return []
+
+
+class PostgreSQLBackend(Backend):
+    name = 'postgresql'
+
+    def insert(self, connection, table, rows, update):
+        # Write directly through psycopg2's execute_values, which sends many
+        # rows per statement without building a dictionary per row
+        from psycopg2.extras import execute_values
+        preparer = connection.dialect.identifier_preparer
+        columns = [preparer.quote(c.name) for c in table.columns]
+        primary_key = [preparer.quote(c.name)
+                       for c in table.primary_key.columns]
+        assignments = []
+        if update:
+            assignments = ['{0} = EXCLUDED.{0}'.format(preparer.quote(c.name))
+                           for c in table.columns if not c.primary_key]
+        sql = 'INSERT INTO {} ({}) VALUES %s ON CONFLICT ({}) DO {}'.format(
+            preparer.format_table(table), ', '.join(columns),
+            ', '.join(primary_key),
+            'UPDATE SET ' + ', '.join(assignments) if assignments
+            else 'NOTHING')
+        cursor = connection.connection.cursor()
+        try:
+            execute_values(cursor, sql, _unique(table, rows),
+                           page_size=self.chunk_size)
+        finally:
+            cursor.close()
+
+    def merge(self, connection, table, rows, assignments, where=None):
+        from psycopg2.extras import execute_values
+        if not rows:
+            return
+        sql = _merge_sql(connection, table, assignments, where, '%s')
+        cursor = connection.connection.cursor()
+        try:
+            execute_values(cursor, sql,
+                           _sorted_by_key(table, _unique(table, rows)),
+                           page_size=self.chunk_size)
+        finally:
+            cursor.close()
+
+    def lock_rows(self, query):
+        return query.with_for_update()
+
+    # Full text search, using GIN indexes on the text search document of the
+    # columns. The document expression of text_search must match the
+    # indexes' for them to be used.
+    text_search_config = 'english'
+
+    def text_search(self, columns, q):
+        config = literal_column("'{}'".format(self.text_search_config))
+        document = columns[0]
+        for column in columns[1:]:
+            document = document + literal_column("' '") + column
+        return func.to_tsvector(config, document).op('@@')(
+            func.plainto_tsquery(config, q))
+
+    def text_search_indexes(self, table, columns):
+        from sqlalchemy.dialects import postgresql
+        preparer = postgresql.dialect().identifier_preparer
+        document = " || ' ' || ".join(preparer.quote(c.name) for c in columns)
+        name = '{}_text_search'.format(table.name)
+        return ["CREATE INDEX IF NOT EXISTS {} ON {} USING gin "
+                "(to_tsvector('{}', {}))".format(
+                    preparer.quote(name), preparer.format_table(table),
+                    self.text_search_config, document)]
+
+
+class SQLiteBackend(Backend):
+    name = 'sqlite'
+
+    def create_engine(self, url, **kwargs):
+        engine = sqlalchemy.create_engine(url, **kwargs)
+
+        @event.listens_for(engine, 'connect')
+        def set_pragmas(dbapi_connection, connection_record):
+            # Let readers (e.g., the web app) proceed while a load is being
+            # written, and don't fsync on every commit
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.close()
+
+        return engine
+
+    def insert_statement(self, table, update=True):
+        # The sqlite3 module's executemany is fast, and SQLite limits the
+        # number of parameters per statement, so stick with one row per
+        # statement
+        return table.insert().prefix_with('OR REPLACE' if update
+                                          else 'OR IGNORE')
+
+
+class DuckDBBackend(Backend):
+    name = 'duckdb'
+
+    def create_engine(self, url, **kwargs):
+        try:
+            import duckdb_engine  # noqa: F401 (registers the dialect)
+        except ImportError:
+            raise RuntimeError('The DuckDB backend requires the duckdb_engine '
+                               'package (pip install duckdb-engine)')
+        return sqlalchemy.create_engine(url, **kwargs)
+
+    def insert(self, connection, table, rows, update):
+        # Executing one statement per row is very slow with DuckDB, so write
+        # multi-row statements
+        prefix = 'OR REPLACE' if update else 'OR IGNORE'
+        rows = _as_dicts(table, _unique(table, rows))
+        for chunk in _chunks(rows, self.chunk_size):
+            connection.execute(table.insert().values(chunk).prefix_with(prefix))
+
+
+BACKENDS = dict((b.name, b) for b in (PostgreSQLBackend, SQLiteBackend,
+                                      DuckDBBackend))
+
+
+def get_backend(name_or_url):
+    """Look up a backend by dialect name or database URL."""
+    name = str(name_or_url)
+    if ':' in name:
+        name = make_url(name).drivername.split('+')[0]
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError('Unsupported database backend: {}'.format(name))
+
+
+def backend_for(bind):
+    """Look up the backend of an engine or connection."""
+    return get_backend(bind.dialect.name)
+
+
+def rows_from_instances(instances):
+    """Convert ORM instances to rows for Backend.upsert.
+
+    Column defaults are filled in for missing values, since every row needs
+    a value for every column. Rows with the same primary key are collapsed,
+    keeping the last.
+
+    Returns:
+        List of (table, rows) tuples, with tables in dependency order
+
+    """
+    by_table = {}
+    for obj in instances:
+        table = obj.__table__
+        row = []
+        for column in table.columns:
+            value = getattr(obj, column.key)
+            if value is None and column.default is not None and \
+                    column.default.is_scalar:
+                value = column.default.arg
+            row.append(value)
+        by_table.setdefault(table, []).append(tuple(row))
+    if not by_table:
+        return []
+    metadata = next(iter(by_table)).metadata
+    return [(table, _unique(table, by_table[table]))
+            for table in metadata.sorted_tables if table in by_table]
@@ -0,0 +1,101 @@
+#! /usr/bin/env python
+"""Micro-benchmark of the row converters compiled from fieldmaps.py.
+
+Compares, on synthetic pitch and batter attributes, the compiled converters
+against the hand-written conversion they replaced (a dictionary of
+try_int/try_float calls, filtered of None values and passed to the ORM
+class), and reports rows per second.
+
+    bench/converters.py --rows 100000
+
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fieldmaps import PITCHES, BATTERS, FLOAT, INT, CONTEXT  # noqa: E402
+from models import Pitch, Batter  # noqa: E402
+from utils import try_int, try_float  # noqa: E402
+
+PITCH_ATTRS = {
+    'des': 'Called Strike', 'id': '3', 'type': 'S', 'tfs': '170512',
+    'tfs_zulu': '2015-05-09T17:05:12Z', 'x': '112.02', 'y': '176.21',
+    'event_num': '3', 'sv_id': '150509_120601', 'play_guid': '',
+    'start_speed': '93.5', 'end_speed': '85.8', 'sz_top': '3.41',
+    'sz_bot': '1.59', 'pfx_x': '-6.27', 'pfx_z': '9.41', 'px': '0.121',
+    'pz': '2.432', 'x0': '-1.452', 'y0': '50.0', 'z0': '5.898',
+    'vx0': '4.99', 'vy0': '-136.739', 'vz0': '-5.585', 'ax': '-10.773',
+    'ay': '30.652', 'az': '-15.137', 'break_y': '23.7',
+    'break_angle': '22.9', 'break_length': '3.9', 'pitch_type': 'FF',
+    'type_confidence': '.900', 'zone': '5', 'nasty': '37',
+    'spin_dir': '213.587', 'spin_rate': '2315.312', 'cc': '', 'mt': '',
+}
+
+BATTER_ATTRS = {
+    'id': '545361', 'name': 'Trout', 'name_display_first_last': 'Mike Trout',
+    'pos': 'CF', 'bo': '200', 'ab': '4', 'po': '3', 'r': '1', 'a': '0',
+    'bb': '1', 'sac': '0', 't': '0', 'sf': '0', 'h': '2', 'e': '0', 'd': '1',
+    'hbp': '0', 'so': '1', 'hr': '0', 'rbi': '1', 'lob': '2', 'fldg': '1.000',
+    'sb': '0', 'cs': '0', 's_hr': '8', 's_rbi': '19', 's_h': '34',
+    's_bb': '17', 's_r': '24', 's_so': '28', 'avg': '.293', 'go': '1',
+    'ao': '0',
+}
+
+CONTEXT_VALUES = {'game_id': 'gid_2015_05_09_houmlb_anamlb_1', 'team_id': 108,
+                  'pitch_id': 3, 'at_bat_number': 1, 'timestamp': None}
+
+
+def handwritten(fieldmap, model):
+    # Equivalent of the parse_* methods before the field maps: a dictionary of
+    # converted values, with None values dropped, passed to the ORM class
+    convert = {INT: try_int, FLOAT: try_float}
+
+    def converter(attrs):
+        d = {}
+        for column, attribute, kind in fieldmap.fields:
+            if kind == CONTEXT:
+                d[column] = CONTEXT_VALUES[attribute]
+            elif kind in convert:
+                d[column] = convert[kind](attrs.get(attribute))
+            else:
+                d[column] = attrs.get(attribute)
+        d = dict((k, v) for k, v in d.items() if v is not None)
+        return model(**d)
+    return converter
+
+
+def compiled(fieldmap):
+    context = dict((attribute, CONTEXT_VALUES[attribute])
+                   for _, attribute, kind in fieldmap.fields
+                   if kind == CONTEXT)
+
+    def converter(attrs):
+        return fieldmap.convert(attrs, **context)
+    return converter
+
+
+def rows_per_second(converter, attrs, rows):
+    start = time.perf_counter()
+    for _ in range(rows):
+        converter(attrs)
+    return rows / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    print('{:<10} {:>18} {:>18} {:>8}'.format('table', 'hand-written rows/s',
+                                              'compiled rows/s', 'speedup'))
+    for fieldmap, model, attrs in ((PITCHES, Pitch, PITCH_ATTRS),
+                                   (BATTERS, Batter, BATTER_ATTRS)):
+        before = rows_per_second(handwritten(fieldmap, model), attrs,
+                                 args.rows)
+        after = rows_per_second(compiled(fieldmap), attrs, args.rows)
+        print('{:<10} {:>18,.0f} {:>18,.0f} {:>7.1f}x'.format(
+            fieldmap.table.name, before, after, after / before))
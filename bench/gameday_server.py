@@ -0,0 +1,236 @@
+#! /usr/bin/env python
+"""Local stand-in for the GameDay server, for load tests.
+
+Serves recorded GameDay data from a directory mirroring the layout of
+gd2.mlb.com/components/game/mlb/ (year_YYYY/month_MM/day_DD/gid_.../...), at
+the same paths utils.date_to_url and utils.gid_to_url build. Directories are
+served as HTML listings like GameDay's, so the loader can't tell the
+difference. Latency, error rate and bandwidth can be configured to mimic a
+slow or flaky server.
+
+Record a few days of games (from the real site) into a directory:
+
+    bench/gameday_server.py record data/gameday --start-date 2015-05-09 \
+        --end-date 2015-05-10
+
+Serve them:
+
+    bench/gameday_server.py serve data/gameday --port 8800 --latency 0.05 \
+        --error-rate 0.01 --bandwidth 2000000
+
+and point the loader at the server:
+
+    export BREAKINGBALL_GAMEDAY_URL=http://localhost:8800/
+
+"""
+
+import argparse
+import datetime as dt
+import html
+import os
+import posixpath
+import random
+import re
+import socketserver
+import sys
+import threading
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import unquote, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Bytes written per write when limiting bandwidth
+CHUNK_SIZE = 16384
+# Game_id in the path of a game's documents
+GAME_PATH = re.compile(r'/(gid_\w+)/')
+
+
+class GameDayHandler(BaseHTTPRequestHandler):
+    """Serves files and directory listings from server.root, after
+    server.latency (plus up to server.jitter) seconds, failing a fraction
+    server.error_rate of requests with a 503 and limiting each response to
+    server.bandwidth bytes per second (if set)."""
+
+    def do_GET(self):
+        server = self.server
+        game = GAME_PATH.search(self.path)
+        if game:
+            with server.lock:
+                server.first_requests.setdefault(game.group(1),
+                                                 time.perf_counter())
+        delay = server.latency + random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+        if random.random() < server.error_rate:
+            with server.lock:
+                server.failed_paths.append(self.path)
+            self.send_error(503, 'Simulated error')
+            return
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            if not self.path.endswith('/'):
+                self.send_response(301)
+                self.send_header('Location', self.path + '/')
+                self.end_headers()
+                return
+            self.send_body(self.listing(path), 'text/html')
+        elif os.path.isfile(path):
+            with open(path, 'rb') as f:
+                self.send_body(f.read(), 'application/xml')
+        else:
+            self.send_error(404)
+
+    def translate_path(self, url_path):
+        # Map the URL path onto server.root, refusing to leave it
+        parts = posixpath.normpath(unquote(urlsplit(url_path).path)).split('/')
+        parts = [p for p in parts if p and p not in ('.', '..')]
+        return os.path.join(self.server.root, *parts)
+
+    def listing(self, path):
+        names = sorted(os.listdir(path))
+        items = []
+        for name in names:
+            if os.path.isdir(os.path.join(path, name)):
+                name += '/'
+            items.append('<li><a href="{0}"> {0}</a></li>'.format(
+                html.escape(name)))
+        return ('<html><body><ul>\n{}\n</ul></body></html>\n'.format(
+            '\n'.join(items))).encode()
+
+    def send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        bandwidth = self.server.bandwidth
+        if not bandwidth:
+            self.wfile.write(body)
+            return
+        for i in range(0, len(body), CHUNK_SIZE):
+            chunk = body[i:i + CHUNK_SIZE]
+            self.wfile.write(chunk)
+            time.sleep(len(chunk) / bandwidth)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class GameDayServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, root, port=8800, latency=0.0, jitter=0.0,
+                 error_rate=0.0, bandwidth=None, verbose=False):
+        """Args:
+            root: Directory of recorded GameDay data
+            port: Port to listen on (0 to pick a free one)
+            latency: Seconds to wait before responding
+            jitter: Maximum additional, random, seconds to wait
+            error_rate: Fraction of requests to fail with a 503
+            bandwidth: Bytes per second per response, or None for no limit
+            verbose: Log every request?
+
+        """
+        HTTPServer.__init__(self, ('localhost', port), GameDayHandler)
+        self.root = root
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.bandwidth = bandwidth
+        self.verbose = verbose
+        # Paths of the requests failed with a simulated error
+        self.failed_paths = []
+        # game_id -> time.perf_counter() of the game's first request
+        self.first_requests = {}
+        self.lock = threading.Lock()
+
+    def failed_games(self):
+        """Game_ids of the games with a request failed with a simulated
+        error."""
+        with self.lock:
+            paths = list(self.failed_paths)
+        return set(m.group(1) for m in map(GAME_PATH.search, paths) if m)
+
+    def started_games(self):
+        """Dictionary of game_ids and the time.perf_counter() of their first
+        request, i.e., when their load started."""
+        with self.lock:
+            return dict(self.first_requests)
+
+    @property
+    def url(self):
+        return 'http://localhost:{}/'.format(self.server_address[1])
+
+
+def record(root, start_date, end_date):
+    """Download GameDay data for the games in a date range into root."""
+    import requests
+    from bs4 import BeautifulSoup
+    import config
+    from utils import daterange, date_to_url, fetch_game_listings
+
+    http = requests.Session()
+
+    def save(url):
+        r = http.get(url)
+        if r.status_code != 200:
+            return None
+        path = os.path.join(root, url[len(config.GAMEDAY_URL):])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(r.content)
+        return r
+
+    for d in daterange(start_date, end_date):
+        save(date_to_url(d) + 'master_scoreboard.xml')
+        for gid in fetch_game_listings(d):
+            print('Recording {}'.format(gid))
+            game_url = date_to_url(d) + gid + '/'
+            save(game_url + 'linescore.xml')
+            save(game_url + 'boxscore.xml')
+            innings = http.get(game_url + 'inning/')
+            soup = BeautifulSoup(innings.text)
+            for link in soup.find_all('a', href=re.compile(r'[0-9]\.xml$')):
+                save(game_url + 'inning/' + link.get('href'))
+
+
+def valid_date(x):
+    return dt.datetime.strptime(x, '%Y-%m-%d').date()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command')
+    serve_parser = subparsers.add_parser('serve', help='Serve recorded data')
+    serve_parser.add_argument('root', help='Directory of recorded data')
+    serve_parser.add_argument('--port', type=int, default=8800)
+    serve_parser.add_argument('--latency', type=float, default=0.0,
+                              help='Seconds to wait before each response')
+    serve_parser.add_argument('--jitter', type=float, default=0.0,
+                              help='Maximum random seconds added to latency')
+    serve_parser.add_argument('--error-rate', type=float, default=0.0,
+                              help='Fraction of requests failing with a 503')
+    serve_parser.add_argument('--bandwidth', type=float,
+                              help='Bytes per second per response')
+    serve_parser.add_argument('--verbose', action='store_true')
+    record_parser = subparsers.add_parser('record',
+                                          help='Record data from GameDay')
+    record_parser.add_argument('root', help='Directory to record into')
+    record_parser.add_argument('--start-date', type=valid_date, required=True)
+    record_parser.add_argument('--end-date', type=valid_date)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        server = GameDayServer(args.root, args.port, args.latency,
+                               args.jitter, args.error_rate, args.bandwidth,
+                               args.verbose)
+        print('Serving {} at {}'.format(args.root, server.url))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    elif args.command == 'record':
+        record(args.root, args.start_date, args.end_date or args.start_date)
+    else:
+        parser.print_help()
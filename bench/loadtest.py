@@ -0,0 +1,216 @@
+#! /usr/bin/env python
+"""End-to-end load test of the loader against the local GameDay stand-in.
+
+Starts bench/gameday_server.py on recorded data, loads every recorded game in
+a date range, and reports games/min, per-game latency (p50 and p99) and
+database rows written per second. Games whose load failed (e.g., on a
+simulated error) are counted separately and excluded from the latencies.
+
+In eager mode, games are loaded in this process with GameLoader, on a pool
+of threads:
+
+    bench/loadtest.py data/gameday --start-date 2015-05-09 --eager --threads 4
+
+Otherwise, the games are dispatched to N celery workers started by the
+harness (a broker must be running), and a game's latency is the time from
+its first request to the stand-in (when a worker starts fetching it) until
+its row appears in the games table, to within --poll-interval. Time spent
+queued before that is excluded. A game is failed once one of its requests
+fails with a simulated error, as the fetch stage then fails:
+
+    bench/loadtest.py data/gameday --start-date 2015-05-09 --workers 4
+
+The games are loaded into the database at BREAKINGBALL_DB_URL, which should
+be a scratch database: --reset drops and recreates all tables first.
+
+"""
+
+import argparse
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from gameday_server import GameDayServer, valid_date  # noqa: E402
+
+
+def percentile(values, p):
+    # Nearest-rank percentile
+    values = sorted(values)
+    if not values:
+        return float('nan')
+    rank = max(int(math.ceil(p / 100.0 * len(values))) - 1, 0)
+    return values[rank]
+
+
+def count_rows(engine):
+    from sqlalchemy import select, func
+    from models import Base
+    with engine.connect() as conn:
+        return sum(conn.execute(select([func.count()]).select_from(t))
+                   .scalar() for t in Base.metadata.sorted_tables)
+
+
+def loaded_games(engine, game_ids):
+    from models import Game
+    from sqlalchemy import select
+    with engine.connect() as conn:
+        result = conn.execute(select([Game.game_id]).where(
+            Game.game_id.in_(list(game_ids))))
+        return set(r[0] for r in result)
+
+
+def recorded_games(root, start_date, end_date):
+    # Listed from disk rather than through the server, so that simulated
+    # errors only affect the loads
+    import config
+    from utils import daterange, date_to_url
+
+    game_ids = []
+    for d in daterange(start_date, end_date):
+        path = os.path.join(root, date_to_url(d)[len(config.GAMEDAY_URL):])
+        if os.path.isdir(path):
+            game_ids.extend(sorted(name for name in os.listdir(path)
+                                   if name.startswith('gid_')))
+    return game_ids
+
+
+def run_eager(game_ids, threads):
+    from db import Session
+    from gameloader import GameLoader
+
+    latencies = {}
+    failures = {}
+
+    def load(gid):
+        start = time.perf_counter()
+        try:
+            GameLoader(gid, Session).load(skip_if_final=False)
+        except Exception as e:
+            failures[gid] = e
+            return
+        latencies[gid] = time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for future in [pool.submit(load, gid) for gid in game_ids]:
+            future.result()
+    return latencies, failures
+
+
+def run_workers(game_ids, args, env, engine, server):
+    workers = [subprocess.Popen(
+        ['celery', '-A', 'gameloader', 'worker', '-Q',
+         'celery,fetch,parse,write', '--concurrency', str(args.concurrency),
+         '-n', 'loadtest{}@%h'.format(i), '--loglevel', 'warning'],
+        cwd=ROOT, env=env) for i in range(args.workers)]
+    try:
+        # Give the workers a moment to connect to the broker
+        time.sleep(args.warmup)
+        from celeryapp import load_game_pipeline
+
+        dispatched = time.perf_counter()
+        for gid in game_ids:
+            load_game_pipeline(gid).apply_async()
+        latencies = {}
+        failures = set()
+        deadline = dispatched + args.timeout
+        while len(latencies) + len(failures) < len(game_ids) and \
+                time.perf_counter() < deadline:
+            now = time.perf_counter()
+            started = server.started_games()
+            for gid in loaded_games(engine, game_ids) - set(latencies):
+                # Timed from when a worker started fetching the game
+                latencies[gid] = now - started.get(gid, dispatched)
+            # A failed request fails the game's fetch stage, so it will never
+            # be loaded
+            failures = server.failed_games() & set(game_ids) - set(latencies)
+            time.sleep(args.poll_interval)
+        elapsed = time.perf_counter() - dispatched
+        return latencies, failures, elapsed
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('root', help='Directory of recorded GameDay data')
+    parser.add_argument('--start-date', type=valid_date, required=True)
+    parser.add_argument('--end-date', type=valid_date)
+    parser.add_argument('--eager', action='store_true',
+                        help='Load in this process instead of with celery')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='Threads loading games in eager mode')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of celery workers to start')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Concurrency of each celery worker')
+    parser.add_argument('--reset', action='store_true',
+                        help='Drop and recreate all tables first')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--bandwidth', type=float)
+    parser.add_argument('--warmup', type=float, default=5.0,
+                        help='Seconds to wait for workers to start')
+    parser.add_argument('--timeout', type=float, default=600.0,
+                        help='Seconds to wait for all games to load')
+    parser.add_argument('--poll-interval', type=float, default=0.2)
+    args = parser.parse_args()
+
+    server = GameDayServer(args.root, port=0, latency=args.latency,
+                           jitter=args.jitter, error_rate=args.error_rate,
+                           bandwidth=args.bandwidth)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # Set before importing config, for this process and the subprocesses
+    os.environ['BREAKINGBALL_GAMEDAY_URL'] = server.url
+    env = dict(os.environ)
+
+    from db import get_engine
+    from models import Base
+
+    engine = get_engine()
+    if args.reset:
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+
+    game_ids = recorded_games(args.root, args.start_date,
+                              args.end_date or args.start_date)
+    if not game_ids:
+        parser.exit(1, 'No recorded games in that date range\n')
+    if loaded_games(engine, game_ids) and not args.eager:
+        parser.exit(1, 'Some games are already loaded; use --reset so their '
+                    'completion can be detected\n')
+
+    rows_before = count_rows(engine)
+    if args.eager:
+        start = time.perf_counter()
+        latencies, failures = run_eager(game_ids, args.threads)
+        elapsed = time.perf_counter() - start
+    else:
+        # Timed from dispatch, excluding the workers' start-up
+        latencies, failures, elapsed = run_workers(game_ids, args, env,
+                                                   engine, server)
+    rows = count_rows(engine) - rows_before
+    server.shutdown()
+
+    values = list(latencies.values())
+    timed_out = len(game_ids) - len(values) - len(failures)
+    print('Games loaded:      {} of {}'.format(len(values), len(game_ids)))
+    print('Games failed:      {}'.format(len(failures)))
+    if timed_out:
+        print('Games timed out:   {}'.format(timed_out))
+    print('Elapsed:           {:.1f} s'.format(elapsed))
+    print('Games/min:         {:.1f}'.format(len(values) / elapsed * 60))
+    print('Latency p50:       {:.2f} s'.format(percentile(values, 50)))
+    print('Latency p99:       {:.2f} s'.format(percentile(values, 99)))
+    print('DB rows written/s: {:.0f} ({} new rows)'.format(rows / elapsed,
+                                                            rows))
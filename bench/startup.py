@@ -0,0 +1,75 @@
+#! /usr/bin/env python
+"""Startup-time benchmark for the dispatcher and web entry points.
+
+load.py runs from cron every few minutes on game days, so its import time is
+paid on every polling cycle. This script imports each entry point in a fresh
+interpreter several times and reports the wall-clock time, along with any
+heavy modules that the entry point shouldn't need.
+
+    bench/startup.py --repeat 20
+
+Exits with a non-zero status if an entry point imports a module it
+shouldn't.
+
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules each entry point should be able to do without. Only modules whose
+# import is up to this repo are listed: e.g., celery itself imports dateutil
+# or pytz, depending on its version.
+FORBIDDEN = {
+    'load': ['gameloader', 'bs4', 'sqlalchemy', 'models', 'db'],
+    'app': ['gameloader', 'celery', 'bs4', 'requests', 'numpy'],
+}
+
+CHECK_SCRIPT = """
+import sys
+import {module}
+print(' '.join(m for m in {forbidden!r} if m in sys.modules))
+"""
+
+
+def time_import(module, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', 'import ' + module],
+                              cwd=ROOT)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def unexpected_imports(module):
+    script = CHECK_SCRIPT.format(module=module, forbidden=FORBIDDEN[module])
+    out = subprocess.check_output([sys.executable, '-c', script], cwd=ROOT)
+    return out.decode().split()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='Number of fresh interpreters per entry point')
+    args = parser.parse_args()
+
+    baseline = time_import('sys', args.repeat)
+    print('{:<8} {:>10} {:>10} {:>10}'.format('module', 'min (ms)',
+                                              'median (ms)', 'net (ms)'))
+    failed = False
+    for module in sorted(FORBIDDEN):
+        timings = time_import(module, args.repeat)
+        print('{:<8} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+            module, min(timings) * 1000, statistics.median(timings) * 1000,
+            (statistics.median(timings) - statistics.median(baseline)) * 1000))
+        extra = unexpected_imports(module)
+        if extra:
+            failed = True
+            print('  {} imports {}'.format(module, ', '.join(extra)))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,50 @@
+"""Celery application shared by the workers and the dispatcher.
+
+This module deliberately imports nothing but Celery, so that load.py can send
+task messages without importing the parsing and database code that the
+workers need. Tasks are registered in gameloader.py and referred to by name.
+
+Loading a game is split into three stages, each routed to its own queue so
+that it can be given a suitable pool and concurrency:
+
+    fetch: downloads the GameDay XML (network-bound)
+    parse: parses the XML into rows (CPU-bound)
+    write: writes the rows to the database
+
+Intermediate results (the raw XML and the parsed rows) are passed from one
+stage to the next in the task messages, pickled and zlib-compressed.
+
+"""
+
+from celery import Celery, chain
+import config
+
+LOAD_GAME_TASK = 'gameloader.load_game'
+FETCH_GAME_TASK = 'gameloader.fetch_game'
+PARSE_GAME_TASK = 'gameloader.parse_game'
+WRITE_GAME_TASK = 'gameloader.write_game'
+
+app = Celery('load', broker=config.BROKER_URL, include=['gameloader'])
+app.conf.update(
+    task_routes={
+        FETCH_GAME_TASK: {'queue': 'fetch'},
+        PARSE_GAME_TASK: {'queue': 'parse'},
+        WRITE_GAME_TASK: {'queue': 'write'},
+    },
+    # Parsed rows are tuples of datetimes, floats, etc., which JSON can't
+    # round-trip
+    task_serializer='pickle',
+    accept_content=['pickle', 'json'],
+    task_compression='zlib',
+)
+
+
+def load_game_pipeline(gid):
+    """Signature of the fetch, parse and write stages of loading a game,
+    chained together. Call apply_async() on it to send it. The game is loaded
+    unconditionally: the dispatcher decides which games need loading."""
+    return chain(
+        app.signature(FETCH_GAME_TASK, args=(gid,)),
+        app.signature(PARSE_GAME_TASK, args=(gid,)),
+        app.signature(WRITE_GAME_TASK, args=(gid,)),
+    )
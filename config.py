@@ -1,2 +1,21 @@
-DB_URL = "postgresql:///breakingball"
-DB_TEST_URL = "postgresql:///breakingballtest"
+import os
+
+# Database URLs. The storage backend (PostgreSQL, SQLite or DuckDB) is picked
+# from the URL; see backends.py.
+DB_URL = os.environ.get('BREAKINGBALL_DB_URL', "postgresql:///breakingball")
+DB_TEST_URL = os.environ.get('BREAKINGBALL_DB_TEST_URL',
+                             "postgresql:///breakingballtest")
+BROKER_URL = os.environ.get('BREAKINGBALL_BROKER_URL',
+                            "amqp://guest@localhost//")
+
+# Root of the GameDay data. Point it at a local stand-in server (see
+# bench/gameday_server.py) for load tests.
+GAMEDAY_URL = os.environ.get('BREAKINGBALL_GAMEDAY_URL',
+                             "http://gd2.mlb.com/components/game/mlb/")
+
+# Opt-in profiling of load_game tasks. Profiling is disabled unless a dump
+# directory is given. PROFILE_RATE is the fraction of games to profile and
+# PROFILE_GAMES is an optional regular expression matched against game_ids.
+PROFILE_DIR = os.environ.get('BREAKINGBALL_PROFILE_DIR')
+PROFILE_RATE = float(os.environ.get('BREAKINGBALL_PROFILE_RATE', 1.0))
+PROFILE_GAMES = os.environ.get('BREAKINGBALL_PROFILE_GAMES')
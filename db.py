@@ -1,19 +1,42 @@
 #! /usr/bin/env python
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, scoped_session
 import config
 import argparse
-from models import Base
+from backends import get_backend
 
-engine = create_engine(config.DB_URL)
-Session = sessionmaker(bind=engine)
+_engine = None
+
+
+def get_engine():
+    # Create the engine on first use rather than at import time, so that
+    # programs importing this module don't pay for it unless they need it.
+    global _engine
+    if _engine is None:
+        _engine = get_backend(config.DB_URL).create_engine(config.DB_URL)
+    return _engine
+
+
+class LazySessionmaker(sessionmaker):
+    """sessionmaker that binds to the application's engine when the first
+    session is created."""
+
+    def __call__(self, **local_kw):
+        if self.kw.get('bind') is None:
+            self.configure(bind=get_engine())
+        return super(LazySessionmaker, self).__call__(**local_kw)
+
+
+Session = LazySessionmaker()
 db_session = scoped_session(Session)
 
 if __name__ == '__main__':
+    from models import Base
+
     parser = argparse.ArgumentParser()
     parser.add_argument('action')
     args = parser.parse_args()
+    engine = get_engine()
 
     if args.action == 'init':
         Base.metadata.create_all(engine)
@@ -26,4 +49,7 @@ if __name__ == '__main__':
             Base.metadata.drop_all(engine)
             Base.metadata.create_all(engine)
 
-
+    if args.action == 'search-index':
+        from search import create_indexes
+        if not create_indexes(engine):
+            print('Text search indexes are only used with PostgreSQL')
@@ -0,0 +1,289 @@
+"""Declarative mappings from GameDay XML attributes to table columns.
+
+Each table below lists, once, where every column of a per-game table comes
+from. A FieldMap compiles its table into a specialized converter function
+that turns an element's attribute dictionary (e.g., a BeautifulSoup Tag's
+attrs) into a plain tuple with a value for every column, in the order of the
+table's columns, ready for Backend.upsert. Values that come from elsewhere
+(the game_id, a parent element, a parsed timestamp) are declared as CONTEXT
+and passed to the converter as keyword arguments.
+
+Field kinds:
+    INT, FLOAT: Converted with the semantics of utils.try_int and
+        utils.try_float (None if missing or invalid), inlined into the
+        converter
+    STR: The attribute's text, unchanged
+    FLAG: True if the attribute is 'T', otherwise False
+    BOOL: True if the attribute is 'true', False if it's anything else, and
+        None (or the column's default) if it's missing
+    CONTEXT: The converter's keyword argument of the given name
+
+Missing values (None) are replaced with the column's default, if it has one,
+as the ORM would when the value is left out.
+
+"""
+
+from models import Player, Batter, Pitcher, Pitch, AtBat, TeamStats
+
+INT = 'int'
+FLOAT = 'float'
+STR = 'str'
+FLAG = 'flag'
+BOOL = 'bool'
+CONTEXT = 'context'
+
+# Templates for the code that converts a single value. {value} is the local
+# variable holding the value and {get} the expression fetching the attribute.
+_TEMPLATES = {
+    STR: '    {value} = {get}\n',
+    FLAG: "    {value} = {get} == 'T'\n",
+    BOOL: ('    {value} = {get}\n'
+           '    if {value} is not None:\n'
+           "        {value} = {value} == 'true'\n"),
+    CONTEXT: '    {value} = {attribute}\n',
+}
+for _kind, _type in ((INT, 'int'), (FLOAT, 'float')):
+    _TEMPLATES[_kind] = (
+        '    {value} = {get}\n'
+        '    if {value} is not None:\n'
+        '        try:\n'
+        '            {value} = ' + _type + '({value})\n'
+        '        except (TypeError, ValueError):\n'
+        '            {value} = None\n')
+
+
+class FieldMap(object):
+    """Mapping from XML attributes to the columns of a model's table.
+
+    Args:
+        model: Declarative model class
+        fields: List of (column, attribute, kind) tuples. For CONTEXT fields,
+            the attribute is the name of the converter's keyword argument.
+            Attributes may be prefixed with the name of a source element
+            (e.g., 'pitching.era'); unprefixed attributes are read from the
+            first source.
+        sources: Names of the converter's positional arguments, each an
+            attribute dictionary
+
+    Attributes:
+        table: The model's Table
+        columns: Column names, in the order of the converter's tuples
+        convert: The compiled converter
+        source: Source code of the compiled converter
+
+    """
+
+    def __init__(self, model, fields, sources=('attrs',)):
+        self.table = model.__table__
+        self.columns = [c.name for c in self.table.columns]
+        self.fields = fields
+        self.sources = sources
+        self.source, self.convert = self._compile()
+
+    def index(self, column):
+        return self.columns.index(column)
+
+    def _compile(self):
+        by_column = {}
+        context = []
+        for column, attribute, kind in self.fields:
+            if column not in self.columns:
+                raise ValueError('{} has no column {}'.format(self.table.name,
+                                                              column))
+            if kind not in _TEMPLATES:
+                raise ValueError('Unknown field kind: {}'.format(kind))
+            if kind == CONTEXT:
+                context.append(attribute)
+            by_column[column] = (attribute, kind)
+
+        namespace = {}
+        params = list(self.sources) + ['{}=None'.format(c) for c in context]
+        code = 'def convert({}):\n'.format(', '.join(params))
+        for source in self.sources:
+            code += '    {0}_get = {0}.get\n'.format(source)
+        values = []
+        for i, column in enumerate(self.table.columns):
+            value = 'c{}'.format(i)
+            values.append(value)
+            attribute, kind = by_column.get(column.name, (None, None))
+            if kind is None:
+                code += '    {} = None\n'.format(value)
+            else:
+                source = self.sources[0]
+                if kind != CONTEXT and '.' in attribute:
+                    source, attribute = attribute.split('.', 1)
+                get = '{}_get({!r})'.format(source, attribute)
+                code += _TEMPLATES[kind].format(value=value, get=get,
+                                                attribute=attribute)
+            if column.default is not None and column.default.is_scalar:
+                namespace['default_' + value] = column.default.arg
+                code += '    if {0} is None:\n        {0} = default_{0}\n' \
+                    .format(value)
+        code += '    return ({},)\n'.format(', '.join(values))
+        exec(compile(code, '<{} converter>'.format(self.table.name), 'exec'),
+             namespace)
+        return code, namespace['convert']
+
+
+# Players are read from both the batter and pitcher elements of boxscore.xml
+PLAYERS = FieldMap(Player, [
+    ('player_id', 'id', INT),
+    ('name', 'name', STR),
+    ('full_name', 'name_display_first_last', STR),
+    ('names_since', 'game_date', CONTEXT),
+])
+
+BATTERS = FieldMap(Batter, [
+    ('game_id', 'game_id', CONTEXT),
+    ('team_id', 'team_id', CONTEXT),
+    ('batter_id', 'id', INT),
+    ('avg', 'avg', FLOAT),
+    ('batting_order', 'bo', INT),
+    ('at_bats', 'ab', INT),
+    ('strikeouts', 'so', INT),
+    ('flyouts', 'ao', INT),
+    ('hits', 'h', INT),
+    ('doubles', 'd', INT),
+    ('triples', 't', INT),
+    ('home_runs', 'hr', INT),
+    ('walks', 'bb', INT),
+    ('hit_by_pitch', 'hbp', INT),
+    ('sac_bunts', 'sac', INT),
+    ('sac_flys', 'fs', INT),
+    ('rbi', 'rbi', INT),
+    ('assists', 'a', INT),
+    ('runs', 'r', INT),
+    ('left_on_base', 'lob', INT),
+    ('caught_stealing', 'cs', INT),
+    ('stolen_bases', 'sb', INT),
+    ('season_walks', 's_bb', INT),
+    ('season_hits', 's_h', INT),
+    ('season_home_runs', 's_hr', INT),
+    ('season_runs', 's_r', INT),
+    ('season_rbi', 's_rbi', INT),
+    ('season_strikeouts', 's_so', INT),
+    ('position', 'pos', STR),
+    ('putouts', 'po', INT),
+    ('errors', 'e', INT),
+    ('fielding', 'fldg', FLOAT),
+])
+
+PITCHERS = FieldMap(Pitcher, [
+    ('pitcher_id', 'id', INT),
+    ('game_id', 'game_id', CONTEXT),
+    ('team_id', 'team_id', CONTEXT),
+    ('position', 'pos', STR),
+    ('outs', 'out', INT),
+    ('batters_faced', 'bf', INT),
+    ('home_runs', 'hr', INT),
+    ('walks', 'bb', INT),
+    ('strikeouts', 'so', INT),
+    ('earned_runs', 'er', INT),
+    ('runs', 'r', INT),
+    ('hits', 'h', INT),
+    ('wins', 'w', INT),
+    ('losses', 'l', INT),
+    ('saves', 'sv', INT),
+    ('era', 'era', FLOAT),
+    ('pitches_thrown', 'np', INT),
+    ('strikes', 's', INT),
+    ('blown_saves', 'bs', INT),
+    ('holds', 'hld', INT),
+    ('season_innings_pitched', 's_ip', FLOAT),
+    ('season_hits', 's_h', INT),
+    ('season_runs', 's_r', INT),
+    ('season_earned_runs', 's_er', INT),
+    ('season_walks', 's_bb', INT),
+    ('season_strikeouts', 's_so', INT),
+    ('game_score', 'game_score', INT),
+    ('blown_save', 'blown_save', BOOL),
+    ('save', 'save', BOOL),
+    ('loss', 'loss', BOOL),
+    ('win', 'win', BOOL),
+])
+
+AT_BATS = FieldMap(AtBat, [
+    ('at_bat_number', 'at_bat_number', CONTEXT),
+    ('game_id', 'game_id', CONTEXT),
+    ('inning', 'inning', CONTEXT),
+    ('inning_half', 'inning_half', CONTEXT),
+    ('balls', 'b', INT),
+    ('strikes', 's', INT),
+    ('outs', 'o', INT),
+    ('start_time', 'start_time', CONTEXT),
+    ('batter_id', 'batter', INT),
+    ('pitcher_id', 'pitcher', INT),
+    ('stands', 'stand', STR),
+    ('p_throws', 'p_throws', STR),
+    ('description', 'des', STR),
+    ('event_num', 'event_num', INT),
+    ('event', 'event', STR),
+    ('score', 'score', FLAG),
+    ('home_team_runs', 'home_team_runs', INT),
+    ('away_team_runs', 'away_team_runs', INT),
+])
+
+PITCHES = FieldMap(Pitch, [
+    ('game_id', 'game_id', CONTEXT),
+    ('pitch_id', 'pitch_id', CONTEXT),
+    ('at_bat_number', 'at_bat_number', CONTEXT),
+    ('description', 'des', STR),
+    ('type', 'type', STR),
+    ('timestamp', 'timestamp', CONTEXT),
+    ('x', 'x', FLOAT),
+    ('y', 'y', FLOAT),
+    ('event_num', 'event_num', INT),
+    ('sv_id', 'sv_id', STR),
+    ('play_guid', 'play_guid', STR),
+    ('start_speed', 'start_speed', FLOAT),
+    ('end_speed', 'end_speed', FLOAT),
+    ('sz_top', 'sz_top', FLOAT),
+    ('sz_bottom', 'sz_bot', FLOAT),
+    ('pfx_x', 'pfx_x', FLOAT),
+    ('pfx_z', 'pfx_z', FLOAT),
+    ('x0', 'x0', FLOAT),
+    ('y0', 'y0', FLOAT),
+    ('z0', 'z0', FLOAT),
+    ('vx0', 'vx0', FLOAT),
+    ('vy0', 'vy0', FLOAT),
+    ('vz0', 'vz0', FLOAT),
+    ('ax', 'ax', FLOAT),
+    ('ay', 'ay', FLOAT),
+    ('az', 'az', FLOAT),
+    ('break_y', 'break_y', FLOAT),
+    ('break_angle', 'break_angle', FLOAT),
+    ('break_length', 'break_length', FLOAT),
+    ('pitch_type', 'pitch_type', STR),
+    ('type_confidence', 'type_confidence', FLOAT),
+    ('zone', 'zone', INT),
+    ('nasty', 'nasty', INT),
+    ('spin_dir', 'spin_dir', FLOAT),
+    ('spin_rate', 'spin_rate', FLOAT),
+])
+
+# Games back, wins and losses come from linescore.xml and the boxscore
+# element, and need more than a conversion, so they're parsed by GameLoader.
+TEAM_STATS = FieldMap(TeamStats, [
+    ('game_id', 'game_id', CONTEXT),
+    ('team_id', 'team_id', CONTEXT),
+    ('at_home', 'at_home', CONTEXT),
+    ('games_back', 'games_back', CONTEXT),
+    ('games_back_wildcard', 'games_back_wildcard', CONTEXT),
+    ('wins', 'wins', CONTEXT),
+    ('losses', 'losses', CONTEXT),
+    ('winrate', 'winrate', CONTEXT),
+    ('avg', 'avg', FLOAT),
+    ('at_bats', 'ab', INT),
+    ('runs', 'r', INT),
+    ('hits', 'h', INT),
+    ('doubles', 'd', INT),
+    ('triples', 't', INT),
+    ('home_runs', 'hr', INT),
+    ('rbis', 'rbi', INT),
+    ('walks', 'bb', INT),
+    ('putouts', 'po', INT),
+    ('da', 'da', INT),
+    ('strikeouts', 'so', INT),
+    ('left_on_base', 'lob', INT),
+    ('era', 'pitching.era', FLOAT),
+], sources=('batting', 'pitching'))
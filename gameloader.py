@@ -1,4 +1,6 @@
-from celery import Celery
+from celery.signals import after_setup_logger
+from celeryapp import app, LOAD_GAME_TASK, FETCH_GAME_TASK, \
+    PARSE_GAME_TASK, WRITE_GAME_TASK
 from itertools import count
 from db import Session
 from bs4 import BeautifulSoup
@@ -8,14 +10,28 @@ from utils import gid_to_url, gid_to_date, try_int, try_float
 import datetime as dt
 import dateutil.parser
 from pytz import timezone
-from models import Game, Team, TeamStats, Pitcher, Batter, Runner, AtBat, Pitch
+from models import Base, Game, Team, Runner
+from fieldmaps import PLAYERS, BATTERS, PITCHERS, AT_BATS, PITCHES, \
+    TEAM_STATS
+from operator import itemgetter
 from sqlalchemy.sql import exists
-from sqlalchemy import exc
+from profiling import profiled
+from heatmaps import update_grids
+from matchups import update_matchups
+from notify import publish
+from backends import backend_for, rows_from_instances
+from players import player_tables, remember as remember_players
 import logging
 
-logging.basicConfig(level=logging.INFO,
-                    filename='load.log',
-                    format='%(asctime)s %(message)s')
+
+@after_setup_logger.connect
+def log_to_file(logger, **kwargs):
+    # Keep a copy of the worker's log in load.log. This used to be done with
+    # logging.basicConfig at import time, which also affected every program
+    # that merely imported this module.
+    handler = logging.FileHandler('load.log')
+    handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    logger.addHandler(handler)
 
 
 class GameLoader(object):
@@ -29,55 +45,75 @@ class GameLoader(object):
         base_url: Root URL for the game's Game Day xml data
         to_load: List of objects pertaining to the game to be loaded to the
             database
+        rows: Dictionary of tables and lists of rows (tuples) to be loaded to
+            the database, converted with the field maps in fieldmaps.py
+        documents: Dictionary of downloaded XML documents ('linescore',
+            'boxscore' and 'innings')
         linescore: Parsed linescore.xml data
         boxscore: Parsed boxscore.xml data
         innings: List of parsed inning.xml data
 
         """
 
-    def __init__(self, game_id, sessionmaker):
+    def __init__(self, game_id, sessionmaker=None):
         """Args:
             game_id: MLB GameDay-formatted game_id
-            sessionmaker: SQLAlchemy Session class
+            sessionmaker: SQLAlchemy Session class. Only needed to write the
+                game (or check whether it's final), so the fetch and parse
+                stages can do without a database.
 
         """
         self.game_id = game_id
-        self.session = sessionmaker()
+        self.session = sessionmaker() if sessionmaker is not None else None
         self.game_date = gid_to_date(game_id)
         self.season = self.game_date.year
         self.base_url = gid_to_url(game_id)
         self.to_load = []
+        self.rows = {}
+        self.documents = {}
         self.http_session = requests.Session()
         self.get = self.http_session.get
 
+    def fetch(self, url):
+        # Download a document. A missing document (e.g., the boxscore of a
+        # game that hasn't started) is empty, but any other error raises a
+        # requests.HTTPError, failing the load instead of storing an empty
+        # game.
+        r = self.get(url)
+        if r.status_code == 404:
+            return ''
+        r.raise_for_status()
+        return r.text
+
     def fetch_linescore(self):
-        # Download and parse linescore.xml
+        # Download linescore.xml
         url = self.base_url + 'linescore.xml'
-        r = self.get(url)
-        soup = BeautifulSoup(r.text).find('game')
-        self.linescore = soup
+        self.documents['linescore'] = self.fetch(url)
 
     def fetch_boxscore(self):
-        # Download and parse boxscore.xml
+        # Download boxscore.xml
         url = self.base_url + 'boxscore.xml'
-        r = self.get(url)
-        soup = BeautifulSoup(r.text).find('boxscore')
-        self.boxscore = soup
+        self.documents['boxscore'] = self.fetch(url)
 
     def fetch_innings(self):
-        # Download and parse all listed innings
+        # Download all listed innings
         list_url = self.base_url + 'inning/'
-        r = self.get(list_url)
-        inning_soup = BeautifulSoup(r.text)
+        inning_soup = BeautifulSoup(self.fetch(list_url))
         # Extract the urls from available innings. While recent seasons include
         # 'inning/inning_all.xml', which contains data on all available innings,
         # earlier seasons did not, so we'll use the 'inning_1.xml',
         # 'inning_2.xml', ... pattern
         urls = inning_soup.find_all('a', href=re.compile(r'[0-9]\.xml$'))
-        innings_request = [self.get(list_url + url.get('href'))
-                           for url in urls]
-        innings_xml = ''.join([x.text for x in innings_request])
-        self.innings = BeautifulSoup(innings_xml)
+        self.documents['innings'] = ''.join(
+            [self.fetch(list_url + url.get('href')) for url in urls])
+
+    def parse_documents(self):
+        # Parse the downloaded linescore, boxscore, and innings XML
+        self.linescore = BeautifulSoup(
+            self.documents.get('linescore', '')).find('game')
+        self.boxscore = BeautifulSoup(
+            self.documents.get('boxscore', '')).find('boxscore')
+        self.innings = BeautifulSoup(self.documents.get('innings', ''))
 
     def parse_game(self):
         # Extract pertinent contents of linescore.xml and boxscore.xml, adding a
@@ -124,8 +160,8 @@ class GameLoader(object):
     def parse_team(self, homeaway='home'):
         # Extract pertinent contents of boxscore.xml. We'll keep one record for
         # each Team per season, to allow for changing team names and/or cities.
-        # Since this will usually be an update (not an insert), merge it here
-        # instead of adding it to the list of objects to be added at once.
+        # This will usually be an update (not an insert), which the upsert in
+        # load() takes care of.
 
         if self.boxscore is None:
             logging.warn('{}: No boxscore available'.format(self.game_id))
@@ -149,17 +185,12 @@ class GameLoader(object):
         # Drop None values
         team = dict((k, v) for k, v in team.items() if v is not None)
         if 'team_id' in team:
-            self.session.merge(Team(**team))
-            self.session.commit()
+            self.to_load.append(Team(**team))
 
     def parse_team_stats(self, homeaway='home'):
         # Parse each team's stats, relative to a single game
-        team_stats = {}
         batting = self.boxscore.find('batting', team_flag=homeaway)
         pitching = self.boxscore.find('pitching', team_flag=homeaway)
-        team_stats['game_id'] = self.game_id
-        team_stats['team_id'] = try_int(self.boxscore.get(homeaway + '_id'))
-        team_stats['at_home'] = (homeaway == 'home')
         games_back_text = self.linescore.get(homeaway + '_games_back')
         games_back_wildcard_text = self.linescore.get(homeaway + '_games_back')
 
@@ -167,205 +198,87 @@ class GameLoader(object):
         # games_back_wildcard is sometimes '-', sometimes missing in this case.
         # If they're 0 games back, set both to 0
         if games_back_text == '-':
-            team_stats['games_back'] = 0
-            team_stats['games_back_wildcard'] = 0
+            games_back = 0
+            games_back_wildcard = 0
         elif games_back_wildcard_text == '-':
-            team_stats['games_back_wildcard'] = 0
-            team_stats['games_back'] = try_float(games_back_text)
+            games_back_wildcard = 0
+            games_back = try_float(games_back_text)
         else:
-            team_stats['games_back'] = try_float(games_back_text)
-            team_stats['games_back_wildcard'] = try_float(games_back_wildcard_text)
+            games_back = try_float(games_back_text)
+            games_back_wildcard = try_float(games_back_wildcard_text)
 
         wins = try_int(self.boxscore.get(homeaway + '_wins', 0))
         losses = try_int(self.boxscore.get(homeaway + '_loss', 0))
-        team_stats['wins'] = wins
-        team_stats['losses'] = losses
-        team_stats['winrate'] = 0 if (wins + losses) == 0 else wins / (wins + losses)
-        team_stats['avg'] = try_float(batting.get('avg'))
-        team_stats['at_bats'] = try_int(batting.get('ab'))
-        team_stats['runs'] = try_int(batting.get('r'))
-        team_stats['hits'] = try_int(batting.get('h'))
-        team_stats['doubles'] = try_int(batting.get('d'))
-        team_stats['triples'] = try_int(batting.get('t'))
-        team_stats['home_runs'] = try_int(batting.get('hr'))
-        team_stats['rbis'] = try_int(batting.get('rbi'))
-        team_stats['walks'] = try_int(batting.get('bb'))
-        team_stats['putouts'] = try_int(batting.get('po'))
-        team_stats['da'] = try_int(batting.get('da'))
-        team_stats['strikeouts'] = try_int(batting.get('so'))
-        team_stats['left_on_base'] = try_int(batting.get('lob'))
-        team_stats['era'] = try_float(pitching.get('era'))
-        # Drop None values and add TeamStats object to the to_load list
-        team_stats = dict((k, v) for k, v in team_stats.items() if v is not None)
-        self.to_load.append(TeamStats(**team_stats))
+        winrate = 0 if (wins + losses) == 0 else wins / (wins + losses)
+        self.add_row(TEAM_STATS, TEAM_STATS.convert(
+            batting.attrs, pitching.attrs, game_id=self.game_id,
+            team_id=try_int(self.boxscore.get(homeaway + '_id')),
+            at_home=(homeaway == 'home'), games_back=games_back,
+            games_back_wildcard=games_back_wildcard, wins=wins, losses=losses,
+            winrate=winrate))
 
     def parse_batters(self):
-        # Parses batter statistics and adds all batters to the to_load list
+        # Parses batter statistics and adds a row for each batter, and for
+        # each batter's name to the players table
         for batter in self.boxscore.find_all('batter'):
-            b = {}
-            b['game_id'] = self.game_id
             homeaway = batter.parent.get('team_flag')
-            b['team_id'] = try_int(self.boxscore.get(homeaway + '_id'))
-            b['batter_id'] = try_int(batter.get('id'))
-            b['name'] = batter.get('name')
-            b['full_name'] = batter.get('name_display_first_last')
-            b['avg'] = try_float(batter.get('avg'))
-            b['batting_order'] = try_int(batter.get('bo'))
-            b['at_bats'] = try_int(batter.get('ab'))
-            b['strikeouts'] = try_int(batter.get('so'))
-            b['flyouts'] = try_int(batter.get('ao'))
-            b['hits'] = try_int(batter.get('h'))
-            b['doubles'] = try_int(batter.get('d'))
-            b['triples'] = try_int(batter.get('t'))
-            b['home_runs'] = try_int(batter.get('hr'))
-            b['walks'] = try_int(batter.get('bb'))
-            b['hit_by_pitch'] = try_int(batter.get('hbp'))
-            b['sac_bunts'] = try_int(batter.get('sac'))
-            b['sac_flys'] = try_int(batter.get('fs'))
-            b['rbi'] = try_int(batter.get('rbi'))
-            b['assists'] = try_int(batter.get('a'))
-            b['runs'] = try_int(batter.get('r'))
-            b['left_on_base'] = try_int(batter.get('lob'))
-            b['caught_stealing'] = try_int(batter.get('cs'))
-            b['stolen_bases'] = try_int(batter.get('sb'))
-            b['season_walks'] = try_int(batter.get('s_bb'))
-            b['season_hits'] = try_int(batter.get('s_h'))
-            b['season_home_runs'] = try_int(batter.get('s_hr'))
-            b['season_runs'] = try_int(batter.get('s_r'))
-            b['season_rbi'] = try_int(batter.get('s_rbi'))
-            b['season_strikeouts'] = try_int(batter.get('s_so'))
-            b['position'] = batter.get('pos')
-            b['putouts'] = try_int(batter.get('po'))
-            b['errors'] = try_int(batter.get('e'))
-            b['fielding'] = try_float(batter.get('fldg'))
-            # Drop None values and add to to_load list
-            b = dict((k, v) for k, v in b.items() if v is not None)
-            self.to_load.append(Batter(**b))
+            self.add_row(PLAYERS, PLAYERS.convert(batter.attrs,
+                                                  game_date=self.game_date))
+            self.add_row(BATTERS, BATTERS.convert(
+                batter.attrs, game_id=self.game_id,
+                team_id=try_int(self.boxscore.get(homeaway + '_id'))))
 
     def parse_pitchers(self):
-        # Parses pitcher statistics and adds all pitchers to the to_load list
+        # Parses pitcher statistics and adds a row for each pitcher, and for
+        # each pitcher's name to the players table
         for pitcher in self.boxscore.find_all('pitcher'):
-            p = {}
-            p['pitcher_id'] = try_int(pitcher.get('id'))
-            p['game_id'] = self.game_id
             homeaway = pitcher.parent.get('team_flag')
-            p['team_id'] = try_int(self.boxscore.get(homeaway + '_id'))
-            p['name'] = pitcher.get('name')
-            p['full_name'] = pitcher.get('name_display_first_last')
-            p['position'] = pitcher.get('pos')
-            p['outs'] = try_int(pitcher.get('out'))
-            p['batters_faced'] = try_int(pitcher.get('bf'))
-            p['home_runs'] = try_int(pitcher.get('hr'))
-            p['walks'] = try_int(pitcher.get('bb'))
-            p['strikeouts'] = try_int(pitcher.get('so'))
-            p['earned_runs'] = try_int(pitcher.get('er'))
-            p['runs'] = try_int(pitcher.get('r'))
-            p['hits'] = try_int(pitcher.get('h'))
-            p['wins'] = try_int(pitcher.get('w'))
-            p['losses'] = try_int(pitcher.get('l'))
-            p['saves'] = try_int(pitcher.get('sv'))
-            p['era'] = try_float(pitcher.get('era'))
-            p['pitches_thrown'] = try_int(pitcher.get('np'))
-            p['strikes'] = try_int(pitcher.get('s'))
-            p['blown_saves'] = try_int(pitcher.get('bs'))
-            p['holds'] = try_int(pitcher.get('hld'))
-            p['season_innings_pitched'] = try_float(pitcher.get('s_ip'))
-            p['season_hits'] = try_int(pitcher.get('s_h'))
-            p['season_runs'] = try_int(pitcher.get('s_r'))
-            p['season_earned_runs'] = try_int(pitcher.get('s_er'))
-            p['season_walks'] = try_int(pitcher.get('s_bb'))
-            p['season_strikeouts'] = try_int(pitcher.get('s_so'))
-            p['game_score'] = try_int(pitcher.get('game_score'))
-            p['blown_save'] = pitcher.get('blown_save')
-            p['save'] = pitcher.get('save')
-            p['loss'] = pitcher.get('loss')
-            p['win'] = pitcher.get('win')
-            # Drop None values and add to the to_load list
-            p = dict((k, v) for k, v in p.items() if v is not None)
-            self.to_load.append(Pitcher(**p))
+            self.add_row(PLAYERS, PLAYERS.convert(pitcher.attrs,
+                                                  game_date=self.game_date))
+            self.add_row(PITCHERS, PITCHERS.convert(
+                pitcher.attrs, game_id=self.game_id,
+                team_id=try_int(self.boxscore.get(homeaway + '_id'))))
 
     def parse_atbats(self):
-        # Parse each at bat and add objects to the to_load list
+        # Parse each at bat and add a row for each
         for atbat in self.innings.find_all('atbat'):
-            ab = {}
-            ab['at_bat_number'] = int(atbat.get('num'))
-            ab['game_id'] = self.game_id
-            ab['inning'] = try_int(atbat.parent.parent.get('num'))
-            ab['inning_half'] = atbat.parent.name
-            ab['balls'] = try_int(atbat.get('b'))
-            ab['strikes'] = try_int(atbat.get('s'))
-            ab['outs'] = try_int(atbat.get('o'))
+            inning = try_int(atbat.parent.parent.get('num'))
             try:
                 t = dateutil.parser.parse(atbat.get('start_tfs_zulu', ''))
-                ab['start_time'] = t.astimezone(timezone('America/New_York'))
+                start_time = t.astimezone(timezone('America/New_York'))
             except ValueError:
+                start_time = None
                 logging.warning('Could not parse timestamp: Game {}; inning{}'.format(
-                    self.game_id, ab['inning']))
-            ab['batter_id'] = try_int(atbat.get('batter'))
-            ab['pitcher_id'] = try_int(atbat.get('pitcher'))
-            ab['stands'] = atbat.get('stand')
-            ab['p_throws'] = atbat.get('p_throws')
-            ab['description'] = atbat.get('des')
-            ab['event_num'] = try_int(atbat.get('event_num'))
-            ab['event'] = atbat.get('event')
-            ab['score'] = atbat.get('score', 'F') == 'T'
-            ab['home_team_runs'] = try_int(atbat.get('home_team_runs'))
-            ab['away_team_runs'] = try_int(atbat.get('away_team_runs'))
-            # Drop nones and add to to_load
-            ab = dict((k, v) for k, v in ab.items() if v is not None)
-            self.to_load.append(AtBat(**ab))
+                    self.game_id, inning))
+            self.add_row(AT_BATS, AT_BATS.convert(
+                atbat.attrs, game_id=self.game_id,
+                at_bat_number=int(atbat.get('num')), inning=inning,
+                inning_half=atbat.parent.name, start_time=start_time))
 
     def parse_pitches(self):
-        # Parse every pitch in all innings, adding them to the to_load list.
+        # Parse every pitch in all innings, adding a row for each
         pitch_counter = count()
         for pitch in self.innings.find_all('pitch'):
             # Some years are missing pitch_ids. Since we're using it as a key,
             # assign here and increment the counter
-            p = {}
-            p['game_id'] = self.game_id
-            p['pitch_id'] = int(pitch.get('id', next(pitch_counter)))
-            p['at_bat_number'] = try_int(pitch.parent.get('num'))
-            p['description'] = pitch.get('des')
-            p['type'] = pitch.get('type')
+            pitch_id = int(pitch.get('id', next(pitch_counter)))
             try:
                 t = dateutil.parser.parse(pitch.get('tfs_zulu', ''))
-                p['timestamp'] = t.astimezone(timezone('America/New_York'))
+                timestamp = t.astimezone(timezone('America/New_York'))
             except ValueError:
+                timestamp = None
                 logging.warning('Could not parse timestamp: Game {}; pitch {}'.format(
-                    self.game_id, p['pitch_id']))
-            p['x'] = try_float(pitch.get('x'))
-            p['y'] = try_float(pitch.get('y'))
-            p['event_num'] = try_int(pitch.get('event_num'))
-            p['sv_id'] = pitch.get('sv_id')
-            p['play_guid'] = pitch.get('play_guid')
-            p['start_speed'] = try_float(pitch.get('start_speed'))
-            p['end_speed'] = try_float(pitch.get('end_speed'))
-            p['sz_top'] = try_float(pitch.get('sz_top'))
-            p['sz_bottom'] = try_float(pitch.get('sz_bot'))
-            p['pfx_x'] = try_float(pitch.get('pfx_x'))
-            p['pfx_z'] = try_float(pitch.get('pfx_z'))
-            p['x0'] = try_float(pitch.get('x0'))
-            p['y0'] = try_float(pitch.get('y0'))
-            p['z0'] = try_float(pitch.get('z0'))
-            p['vx0'] = try_float(pitch.get('vx0'))
-            p['vy0'] = try_float(pitch.get('vy0'))
-            p['vz0'] = try_float(pitch.get('vz0'))
-            p['ax'] = try_float(pitch.get('ax'))
-            p['ay'] = try_float(pitch.get('ay'))
-            p['az'] = try_float(pitch.get('az'))
-            p['break_y'] = try_float(pitch.get('break_y'))
-            p['break_angle'] = try_float(pitch.get('break_angle'))
-            p['break_length'] = try_float(pitch.get('break_length'))
-            p['pitch_type'] = pitch.get('pitch_type')
-            p['type_confidence'] = try_float(pitch.get('type_confidence'))
-            p['zone'] = try_int(pitch.get('zone'))
-            p['nasty'] = try_int(pitch.get('nasty'))
-            p['spin_dir'] = try_float(pitch.get('spin_dir'))
-            p['spin_rate'] = try_float(pitch.get('spin_rate'))
-            # Drop None items and add Pitch to to_load
-            p = dict((k, v) for k, v in p.items() if v is not None)
-            logging.info(p)
-            self.to_load.append(Pitch(**p))
+                    self.game_id, pitch_id))
+            row = PITCHES.convert(
+                pitch.attrs, game_id=self.game_id, pitch_id=pitch_id,
+                at_bat_number=try_int(pitch.parent.get('num')),
+                timestamp=timestamp)
+            logging.debug(row)
+            self.add_row(PITCHES, row)
+
+    def add_row(self, fieldmap, row):
+        # Add a row converted with one of the field maps to the rows to load
+        self.rows.setdefault(fieldmap.table, []).append(row)
 
     def parse_runners(self):
         # Parse all runners
@@ -395,8 +308,14 @@ class GameLoader(object):
         self.fetch_innings()
 
     def parse_all(self):
-        if (self.linescore is not None) & (self.boxscore is not None):
+        self.parse_documents()
+        # Games that haven't started (e.g., in Preview) have a linescore but
+        # no boxscore yet. Their game row is still written, so the
+        # dispatcher sees their stored status match the scoreboard's and
+        # doesn't send them again until they start.
+        if self.linescore is not None:
             self.parse_game()
+        if (self.linescore is not None) & (self.boxscore is not None):
             self.parse_team('home')
             self.parse_team('away')
             self.parse_team_stats('home')
@@ -407,6 +326,11 @@ class GameLoader(object):
             self.parse_pitches()
             self.parse_runners()
 
+    def is_final(self):
+        # Does the game exist in the database with a status of 'Final'?
+        return self.session.query(exists().where(
+            (Game.game_id == self.game_id) & (Game.status == 'Final'))).scalar()
+
     def load(self, skip_if_final=True):
         """Fetch all pertinent XML data, parse, and load into the database.
         Args:
@@ -415,35 +339,135 @@ class GameLoader(object):
                 False, force refresh of all data
 
         """
-        if skip_if_final:
-            loaded = self.session.query(exists().where(
-                (Game.game_id == self.game_id) & (Game.status == 'Final'))).scalar()
-            if loaded:
-                logging.info('{} exists with status = "Final". Skipping'.format(
-                    self.game_id))
-                # Be sure to close the session if we exit early!
-                # TODO: Create the session in this method and wrap in a context
-                # manager?
-                self.session.close()
-                return
-        self.fetch_all()
-        self.parse_all()
-        # Poor-man's upsert. Try adding all objects. If there's a primary key
-        # conflict, merge instead.
-        try:
-            self.session.add_all(self.to_load)
-            # The integrity error won't be thrown until a commit
-            self.session.commit()
-        except exc.IntegrityError:
-            self.session.rollback()
-            [self.session.merge(x) for x in self.to_load]
-            self.session.commit()
-        self.session.close()
+        if skip_if_final and self.is_final():
+            logging.info('{} exists with status = "Final". Skipping'.format(
+                self.game_id))
+            # Be sure to close the session if we exit early!
+            # TODO: Create the session in this method and wrap in a context
+            # manager?
+            self.session.close()
+            return
+        with profiled(self.game_id, 'fetch'):
+            self.fetch_all()
+        with profiled(self.game_id, 'parse'):
+            self.parse_all()
+        self.write(self.collect_rows())
+
+    def collect_rows(self):
+        # All parsed rows, as a list of (table, rows) tuples in dependency
+        # order
+        tables = dict(rows_from_instances(self.to_load))
+        tables.update(self.rows)
+        return [(table, tables[table]) for table in Base.metadata.sorted_tables
+                if table in tables]
+
+    def write(self, tables):
+        """Write parsed rows to the database and update the heatmaps and
+        matchups, in a single transaction.
 
+        Args:
+            tables: List of (table, rows) tuples in dependency order, as
+                returned by collect_rows
 
-app = Celery('load', broker='amqp://guest@localhost//')
+        """
+        with profiled(self.game_id, 'load'):
+            # Only write players rows that may change what this process has
+            # already written
+            tables, new_players = player_tables(tables)
+            # Bulk upsert all rows, table by table, within the session's
+            # transaction. How that's done depends on the storage backend.
+            backend = backend_for(self.session.get_bind())
+            connection = self.session.connection()
+            for table, rows in tables:
+                backend.upsert(connection, table, rows)
+        with profiled(self.game_id, 'heatmaps'):
+            # Update the heatmaps in the same transaction, so a failed load
+            # doesn't leave them counting pitches that weren't stored
+            update_grids(self.session, self.game_id, self.season,
+                         pitch_locations(dict(tables)))
+        with profiled(self.game_id, 'matchups'):
+            update_matchups(self.session, self.game_id,
+                            *matchup_rows(dict(tables)))
+        # Tell the web app the game changed, once it's committed
+        publish(self.session, self.game_id)
+        self.session.commit()
+        remember_players(new_players)
+        self.session.close()
 
-@app.task
+
+def pitch_locations(tables):
+    # (pitch_id, pitcher_id, batter_id, stands, pitch_type, x, y) for each
+    # parsed pitch, as expected by heatmaps.update_grids
+    at_bat_number = AT_BATS.index('at_bat_number')
+    at_bat_fields = itemgetter(AT_BATS.index('pitcher_id'),
+                               AT_BATS.index('batter_id'),
+                               AT_BATS.index('stands'))
+    pitch_fields = itemgetter(PITCHES.index('pitch_type'),
+                              PITCHES.index('x'), PITCHES.index('y'))
+    pitch_at_bat = PITCHES.index('at_bat_number')
+    pitch_id = PITCHES.index('pitch_id')
+    atbats = dict((row[at_bat_number], at_bat_fields(row))
+                  for row in tables.get(AT_BATS.table, []))
+    locations = []
+    for row in tables.get(PITCHES.table, []):
+        atbat = atbats.get(row[pitch_at_bat])
+        if atbat is None:
+            continue
+        locations.append((row[pitch_id],) + atbat + pitch_fields(row))
+    return locations
+
+
+def matchup_rows(tables):
+    # (at_bat_number, batter_id, pitcher_id, event) for each parsed at-bat
+    # and (at_bat_number, pitch_type, type, description, start_speed) for
+    # each parsed pitch, as expected by matchups.update_matchups
+    at_bat_fields = itemgetter(*[AT_BATS.index(c) for c in (
+        'at_bat_number', 'batter_id', 'pitcher_id', 'event')])
+    pitch_fields = itemgetter(*[PITCHES.index(c) for c in (
+        'at_bat_number', 'pitch_type', 'type', 'description', 'start_speed')])
+    return ([at_bat_fields(row) for row in tables.get(AT_BATS.table, [])],
+            [pitch_fields(row) for row in tables.get(PITCHES.table, [])])
+
+
+@app.task(name=LOAD_GAME_TASK)
 def load_game(gid, skip_if_final):
+    # Fetch, parse and write a game within a single task
     g = GameLoader(gid, Session)
     g.load(skip_if_final=skip_if_final)
+
+
+# The same work split into stages, each routed to its own queue (see
+# celeryapp.py) so that the network-bound, CPU-bound and database-bound work
+# can be scaled separately. The stages are chained by
+# celeryapp.load_game_pipeline, each passing its result to the next. Only the
+# write stage touches the database: a blocking database query would stall a
+# fetch worker's whole green-thread pool. Final games are skipped by the
+# dispatcher instead.
+
+@app.task(name=FETCH_GAME_TASK)
+def fetch_game(gid):
+    # Returns the downloaded XML documents
+    g = GameLoader(gid)
+    with profiled(gid, 'fetch'):
+        g.fetch_all()
+    return g.documents
+
+
+@app.task(name=PARSE_GAME_TASK)
+def parse_game(documents, gid):
+    # Returns a list of (table name, rows) tuples in dependency order
+    if documents is None:
+        return None
+    g = GameLoader(gid)
+    g.documents = documents
+    with profiled(gid, 'parse'):
+        g.parse_all()
+    return [(table.name, rows) for table, rows in g.collect_rows()]
+
+
+@app.task(name=WRITE_GAME_TASK)
+def write_game(tables, gid):
+    if tables is None:
+        return
+    g = GameLoader(gid, Session)
+    g.write([(Base.metadata.tables[name], rows) for name, rows in tables])
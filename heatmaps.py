@@ -0,0 +1,170 @@
+#! /usr/bin/env python
+"""Precomputed pitch location heatmaps.
+
+Pitch locations (Pitch.x and Pitch.y, in GameDay's pixel coordinates) are
+binned into a fixed GRID_BINS x GRID_BINS grid for each (pitcher or batter,
+season, pitch type, batter handedness) and stored as compressed counts in the
+pitch_location_grids table. GameLoader adds each game's new pitches to the
+grids as it loads them, so serving a heatmap reads a handful of small rows
+instead of scanning all of a player's pitches.
+
+Games loaded before the grids existed can be added with:
+
+    ./heatmaps.py backfill --season 2015
+
+"""
+
+import zlib
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy import and_
+
+from backends import backend_for
+from indexes import lock_watermark, main
+from models import AtBat, Pitch, PitchLocationGrid
+
+GRID_BINS = 25
+X_RANGE = (0.0, 250.0)
+Y_RANGE = (0.0, 250.0)
+ROLES = ('pitcher', 'batter')
+WATERMARK = 'pitch_location_grids'
+
+
+def bin_locations(x, y):
+    """Bin pitch locations into a GRID_BINS x GRID_BINS array of counts,
+    indexed [x_bin, y_bin]. Locations outside of X_RANGE and Y_RANGE are
+    dropped."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    counts, _, _ = np.histogram2d(x, y, bins=GRID_BINS,
+                                  range=[X_RANGE, Y_RANGE])
+    return counts.astype(np.uint32)
+
+
+def encode_grid(counts):
+    return zlib.compress(counts.astype('<u4').tobytes())
+
+
+def decode_grid(data):
+    counts = np.frombuffer(zlib.decompress(data), dtype='<u4')
+    return counts.reshape(GRID_BINS, GRID_BINS).astype(np.uint32)
+
+
+def grid_updates(season, locations):
+    """Group pitch locations by grid key and bin them.
+
+    Args:
+        season: Season of the game the pitches belong to
+        locations: Iterable of (pitcher_id, batter_id, stands, pitch_type, x,
+            y) tuples. Pitches without a location are skipped.
+
+    Returns:
+        Dictionary of (player_id, role, season, pitch_type, stands) keys and
+        arrays of counts
+
+    """
+    coords = defaultdict(lambda: ([], []))
+    for pitcher_id, batter_id, stands, pitch_type, x, y in locations:
+        if x is None or y is None:
+            continue
+        for role, player_id in zip(ROLES, (pitcher_id, batter_id)):
+            if player_id is None:
+                continue
+            key = (player_id, role, season, pitch_type or '', stands or '')
+            coords[key][0].append(float(x))
+            coords[key][1].append(float(y))
+    return dict((key, bin_locations(xs, ys))
+                for key, (xs, ys) in coords.items())
+
+
+def _add_grids(session, backend, updates):
+    # Add counts to the grids. Missing grids are inserted empty first
+    # (insert-or-ignore, so concurrent loads inserting the same grid don't
+    # fail), then all of them are locked in a single query, in primary key
+    # order so overlapping loads (e.g., of a doubleheader) can't deadlock.
+    if not updates:
+        return
+    keys = sorted(updates)
+    empty = encode_grid(np.zeros((GRID_BINS, GRID_BINS), dtype=np.uint32))
+    backend.upsert(session.connection(), PitchLocationGrid.__table__,
+                   [key + (0, empty) for key in keys], update=False)
+    seasons = set(key[2] for key in keys)
+    player_ids = set(key[0] for key in keys)
+    grids = backend.lock_rows(session.query(PitchLocationGrid).filter(
+        PitchLocationGrid.player_id.in_(player_ids) &
+        PitchLocationGrid.season.in_(seasons)).order_by(
+        *PitchLocationGrid.__table__.primary_key.columns)) \
+        .populate_existing().all()
+    for grid in grids:
+        counts = updates.get((grid.player_id, grid.role, grid.season,
+                              grid.pitch_type, grid.stands))
+        if counts is not None:
+            grid.pitches += int(counts.sum())
+            grid.counts = encode_grid(decode_grid(grid.counts) + counts)
+
+
+def update_grids(session, game_id, season, locations):
+    """Add a game's pitches to the grids, skipping pitches already added by
+    an earlier load of the same game.
+
+    Args:
+        session: SQLAlchemy session
+        game_id: MLB GameDay-formatted game_id
+        season: Season of the game
+        locations: Iterable of (pitch_id, pitcher_id, batter_id, stands,
+            pitch_type, x, y) tuples for every pitch of the game
+
+    """
+    watermark = lock_watermark(session, WATERMARK, game_id)
+    new = [l for l in locations if l[0] > watermark.position]
+    if not new:
+        return
+    watermark.position = max(l[0] for l in new)
+    _add_grids(session, backend_for(session.get_bind()),
+               grid_updates(season, (l[1:] for l in new)))
+    session.flush()
+
+
+def get_grid(session, role, player_id, season, pitch_type=None, stands=None):
+    """Read a player's heatmap, summed over pitch types and/or batter
+    handedness unless they're given.
+
+    Returns:
+        Tuple of (array of counts, number of pitches)
+
+    """
+    query = session.query(PitchLocationGrid).filter(
+        (PitchLocationGrid.role == role) &
+        (PitchLocationGrid.player_id == player_id) &
+        (PitchLocationGrid.season == season))
+    if pitch_type is not None:
+        query = query.filter(PitchLocationGrid.pitch_type == pitch_type)
+    if stands is not None:
+        query = query.filter(PitchLocationGrid.stands == stands)
+    counts = np.zeros((GRID_BINS, GRID_BINS), dtype=np.uint32)
+    pitches = 0
+    for grid in query:
+        counts += decode_grid(grid.counts)
+        pitches += grid.pitches
+    return counts, pitches
+
+
+def stored_locations(session, game_id):
+    """Read a loaded game's pitch locations, with the pitcher, batter and
+    batter handedness of their at-bats."""
+    return session.query(
+        Pitch.pitch_id, AtBat.pitcher_id, AtBat.batter_id, AtBat.stands,
+        Pitch.pitch_type, Pitch.x, Pitch.y).join(
+            AtBat, and_(Pitch.game_id == AtBat.game_id,
+                        Pitch.at_bat_number == AtBat.at_bat_number)).filter(
+            Pitch.game_id == game_id).all()
+
+
+def update_stored(session, game_id, season):
+    # Bin a loaded game's pitch locations
+    update_grids(session, game_id, season, stored_locations(session, game_id))
+
+
+if __name__ == '__main__':
+    main(WATERMARK, update_stored)
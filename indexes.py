@@ -0,0 +1,77 @@
+"""Shared plumbing of the precomputed indexes (heatmaps.py, matchups.py).
+
+Each index records, per game, the last position (e.g., pitch_id) it has
+added in the index_watermarks table, so reloading a game only adds what's
+new. An index module provides:
+
+    An update function, called by GameLoader.write with a game's parsed
+        rows. It locks the game's watermark with lock_watermark, adds what's
+        past it, and flushes without committing, so the index is updated in
+        the same transaction as the game's rows.
+    update_stored(session, game_id, season), which reads a loaded game's
+        rows back from the database and passes them to the update function,
+        for backfill.
+
+Games loaded before an index existed are added by its backfill command,
+e.g.:
+
+    ./heatmaps.py backfill --season 2015
+
+"""
+
+import argparse
+
+from backends import backend_for
+from models import Game, IndexWatermark
+
+
+def lock_watermark(session, name, game_id):
+    """Get an index's watermark for a game, creating it (at position -1) if
+    it doesn't exist, locked until the end of the session's transaction so
+    concurrent loads of the same game add its rows once."""
+    backend = backend_for(session.get_bind())
+    # Insert-or-ignore, so concurrent first loads don't both insert it
+    backend.upsert(session.connection(), IndexWatermark.__table__,
+                   [(name, game_id, -1)], update=False)
+    return backend.lock_rows(session.query(IndexWatermark).filter(
+        (IndexWatermark.name == name) &
+        (IndexWatermark.game_id == game_id))).populate_existing().one()
+
+
+def backfill(session, name, update_game, season=None):
+    """Add all loaded games that an index hasn't seen yet, committing after
+    each game.
+
+    Args:
+        session: SQLAlchemy session
+        name: Name of the index's watermarks
+        update_game: Function of (session, game_id, season) adding a loaded
+            game to the index
+        season: Only add games from this season
+
+    """
+    seen = session.query(IndexWatermark.game_id).filter(
+        IndexWatermark.name == name)
+    games = session.query(Game.game_id, Game.season).filter(
+        ~Game.game_id.in_(seen.subquery()))
+    if season is not None:
+        games = games.filter(Game.season == season)
+    for game_id, game_season in games.all():
+        update_game(session, game_id, game_season)
+        session.commit()
+
+
+def main(name, update_game):
+    """Command line interface of an index's module."""
+    from db import Session
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('action', choices=['backfill'])
+    parser.add_argument('--season', type=int,
+                        help='Only backfill games from this season')
+    args = parser.parse_args()
+
+    session = Session()
+    if args.action == 'backfill':
+        backfill(session, name, update_game, args.season)
+    session.close()
@@ -1,10 +1,12 @@
 #!/usr/bin/env python
 
-from gameloader import load_game
 import sys
 import argparse
 import datetime as dt
+from celeryapp import load_game_pipeline
 from utils import daterange, fetch_game_listings
+from scoreboard import fetch_scoreboard, stored_states, games_to_load, \
+    not_final
 
 
 def valid_date(x):
@@ -14,22 +16,56 @@ def valid_date(x):
         msg = 'Not a valid date: "{0}"'.format(x)
         raise argparse.ArgumentTypeError(msg)
 
-parser = argparse.ArgumentParser()
-parser.add_argument('--start-date', help='First game date to extract',
-                    type=valid_date, required=True)
-parser.add_argument('--end-date', help='Last game date to extract',
-                    type=valid_date, required=False)
-parser.add_argument('--refresh',
-                    help='Reload the game data, even if the score is final',
-                    required=False, action='store_true')
-args = parser.parse_args()
-print(args)
-
-if args.end_date is None:
-    args.end_date = args.start_date
-
-for d in daterange(args.start_date, args.end_date):
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--start-date', help='First game date to extract',
+                        type=valid_date, required=True)
+    parser.add_argument('--end-date', help='Last game date to extract',
+                        type=valid_date, required=False)
+    parser.add_argument('--refresh',
+                        help='Reload the game data, even if the score is final',
+                        required=False, action='store_true')
+    args = parser.parse_args(argv)
+    print(args)
+
+    if args.end_date is None:
+        args.end_date = args.start_date
+
+    # Tasks are sent by name, so the dispatcher never has to import
+    # gameloader and its parsing and database dependencies.
+    for d in daterange(args.start_date, args.end_date):
+        if args.refresh:
+            game_ids = listed_games(d)
+        else:
+            game_ids = changed_games(d)
+        for gid in game_ids:
+            load_game_pipeline(gid).apply_async()
+
+
+def listed_games(d):
     print('Getting listings for {}'.format(d.strftime('%Y-%m-%d')))
-    game_ids = fetch_game_listings(d)
-    for gid in game_ids:
-        load_game.delay(gid, skip_if_final=not args.refresh)
+    return fetch_game_listings(d)
+
+
+def changed_games(d):
+    # Use the day's scoreboard to find the games whose status or inning
+    # changed since they were loaded, falling back to the listed games that
+    # aren't final if there's no scoreboard
+    print('Getting scoreboard for {}'.format(d.strftime('%Y-%m-%d')))
+    games = fetch_scoreboard(d)
+    from db import Session
+    session = Session()
+    try:
+        stored = stored_states(session, d.date())
+    finally:
+        session.close()
+    if games is None:
+        return not_final(listed_games(d), stored)
+    game_ids = games_to_load(games, stored)
+    print('{} of {} games changed'.format(len(game_ids), len(games)))
+    return game_ids
+
+
+if __name__ == '__main__':
+    main()
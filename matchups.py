@@ -0,0 +1,211 @@
+#! /usr/bin/env python
+"""Precomputed batter vs. pitcher matchups.
+
+Plate appearance outcomes are counted per (batter, pitcher) in the matchups
+table, and pitch results per (batter, pitcher, pitch type) in the
+matchup_pitch_types table. GameLoader adds each game's newly completed at-bats
+to the counts as it loads them, so looking up a matchup reads a few rows by
+primary key instead of scanning at_bats and pitches.
+
+Games loaded before the matchups existed can be added with:
+
+    ./matchups.py backfill --season 2015
+
+"""
+
+from collections import defaultdict
+
+from backends import backend_for
+from indexes import lock_watermark, main
+from models import AtBat, Pitch, Matchup, MatchupPitchType
+
+WATERMARK = 'matchups'
+
+# Plate appearance counts of the matchups table, by at-bat event
+HITS = {'Single': 'singles', 'Double': 'doubles', 'Triple': 'triples',
+        'Home Run': 'home_runs'}
+WALKS = ('Walk', 'Intent Walk')
+STRIKEOUTS = ('Strikeout', 'Strikeout - DP')
+HIT_BY_PITCH = ('Hit By Pitch',)
+# Plate appearances that don't count as at-bats
+NOT_AT_BATS = WALKS + HIT_BY_PITCH + (
+    'Sac Bunt', 'Sac Fly', 'Sac Fly DP', 'Sacrifice Bunt DP',
+    'Catcher Interference', 'Batter Interference')
+# Events ending an at_bat element without completing the plate appearance,
+# e.g., the third out made on the bases
+NOT_PLATE_APPEARANCES = ('Caught Stealing', 'Pickoff', 'Runner Out')
+
+MATCHUP_COUNTS = ('plate_appearances', 'at_bats', 'hits', 'singles',
+                  'doubles', 'triples', 'home_runs', 'walks', 'strikeouts',
+                  'hit_by_pitch')
+PITCH_TYPE_COUNTS = ('pitches', 'strikes', 'balls', 'in_play', 'whiffs',
+                     'speeds', 'speed_total')
+
+
+def outcome_counts(event):
+    """Counts a plate appearance with the given at-bat event adds to its
+    matchup, or None if the event doesn't complete a plate appearance."""
+    if not event or event.startswith(NOT_PLATE_APPEARANCES):
+        return None
+    counts = dict.fromkeys(MATCHUP_COUNTS, 0)
+    counts['plate_appearances'] = 1
+    if event not in NOT_AT_BATS:
+        counts['at_bats'] = 1
+    if event in HITS:
+        counts['hits'] = 1
+        counts[HITS[event]] = 1
+    counts['walks'] = int(event in WALKS)
+    counts['strikeouts'] = int(event in STRIKEOUTS)
+    counts['hit_by_pitch'] = int(event in HIT_BY_PITCH)
+    return counts
+
+
+def pitch_counts(type, description, start_speed):
+    """Counts a pitch adds to its matchup's pitch type."""
+    return {
+        'pitches': 1,
+        'strikes': int(type == 'S'),
+        'balls': int(type == 'B'),
+        'in_play': int(type == 'X'),
+        'whiffs': int(description.startswith(('Swinging Strike',
+                                              'Missed Bunt'))),
+        'speeds': int(start_speed is not None),
+        'speed_total': float(start_speed or 0.0),
+    }
+
+
+def matchup_updates(at_bats, pitches):
+    """Sum at-bat outcomes and pitch results by matchup.
+
+    Args:
+        at_bats: Iterable of (at_bat_number, batter_id, pitcher_id, event)
+            tuples
+        pitches: Iterable of (at_bat_number, pitch_type, type, description,
+            start_speed) tuples. Pitches of at-bats not in at_bats are
+            skipped.
+
+    Returns:
+        Tuple of dictionaries of the counts to add, keyed by (batter_id,
+        pitcher_id) and by (batter_id, pitcher_id, pitch_type)
+
+    """
+    matchups = defaultdict(lambda: dict.fromkeys(MATCHUP_COUNTS, 0))
+    pitch_types = defaultdict(lambda: dict.fromkeys(PITCH_TYPE_COUNTS, 0))
+    players = {}
+    for at_bat_number, batter_id, pitcher_id, event in at_bats:
+        if batter_id is None or pitcher_id is None:
+            continue
+        players[at_bat_number] = (batter_id, pitcher_id)
+        counts = outcome_counts(event)
+        if counts is None:
+            continue
+        total = matchups[(batter_id, pitcher_id)]
+        for name, count in counts.items():
+            total[name] += count
+    for at_bat_number, pitch_type, type, description, start_speed in pitches:
+        if at_bat_number not in players:
+            continue
+        key = players[at_bat_number] + (pitch_type or '',)
+        total = pitch_types[key]
+        for name, count in pitch_counts(type or '', description or '',
+                                        start_speed).items():
+            total[name] += count
+    return dict(matchups), dict(pitch_types)
+
+
+def _add_counts(session, backend, model, updates):
+    # Add counts to the model's rows, inserting missing rows, in a single
+    # statement so concurrent loads adding to the same rows don't conflict
+    table = model.__table__
+    counts = [c.name for c in table.columns if not c.primary_key]
+    backend.merge(session.connection(), table,
+                  [key + tuple(update[c] for c in counts)
+                   for key, update in updates.items()],
+                  dict((c, '{{old}}.{0} + {{new}}.{0}'.format(c))
+                       for c in counts))
+
+
+def update_matchups(session, game_id, at_bats, pitches):
+    """Add a game's completed at-bats and their pitches to the matchups,
+    skipping at-bats already added by an earlier load of the same game.
+    At-bats in progress (without an event) and those after them are left
+    for a later load.
+
+    Args:
+        session: SQLAlchemy session
+        game_id: MLB GameDay-formatted game_id
+        at_bats: Iterable of (at_bat_number, batter_id, pitcher_id, event)
+            tuples for every at-bat of the game
+        pitches: Iterable of (at_bat_number, pitch_type, type, description,
+            start_speed) tuples for every pitch of the game
+
+    """
+    watermark = lock_watermark(session, WATERMARK, game_id)
+    new = []
+    for at_bat in sorted(at_bats):
+        if not at_bat[3]:
+            break
+        if at_bat[0] > watermark.position:
+            new.append(at_bat)
+    if not new:
+        return
+    watermark.position = new[-1][0]
+
+    backend = backend_for(session.get_bind())
+    matchups, pitch_types = matchup_updates(new, pitches)
+    _add_counts(session, backend, Matchup, matchups)
+    _add_counts(session, backend, MatchupPitchType, pitch_types)
+    session.flush()
+
+
+def get_matchup(session, batter_id, pitcher_id):
+    """Read a batter's results against a pitcher.
+
+    Returns:
+        Dictionary of plate appearance counts, with the results of each pitch
+        type under 'pitch_types'
+
+    """
+    matchup = session.query(Matchup).get((batter_id, pitcher_id))
+    result = dict((name, getattr(matchup, name, 0)) for name in
+                  MATCHUP_COUNTS)
+    result['pitch_types'] = {}
+    for row in session.query(MatchupPitchType).filter(
+            (MatchupPitchType.batter_id == batter_id) &
+            (MatchupPitchType.pitcher_id == pitcher_id)):
+        counts = dict((name, getattr(row, name)) for name in
+                      PITCH_TYPE_COUNTS if name not in ('speeds',
+                                                        'speed_total'))
+        counts['avg_speed'] = (row.speed_total / row.speeds if row.speeds
+                               else None)
+        result['pitch_types'][row.pitch_type] = counts
+    return result
+
+
+def stored_at_bats(session, game_id):
+    """Read the batter, pitcher and event of a loaded game's at-bats."""
+    return session.query(AtBat.at_bat_number, AtBat.batter_id,
+                         AtBat.pitcher_id, AtBat.event).filter(
+        AtBat.game_id == game_id).all()
+
+
+def stored_pitches(session, game_id):
+    """Read the type, result and speed of a loaded game's pitches. Speeds
+    are stored as decimals and converted to floats."""
+    return [(at_bat_number, pitch_type, type, description,
+             None if start_speed is None else float(start_speed))
+            for at_bat_number, pitch_type, type, description, start_speed
+            in session.query(Pitch.at_bat_number, Pitch.pitch_type,
+                             Pitch.type, Pitch.description,
+                             Pitch.start_speed).filter(
+                Pitch.game_id == game_id)]
+
+
+def update_stored(session, game_id, season):
+    # Count a loaded game's completed at-bats and their pitches
+    update_matchups(session, game_id, stored_at_bats(session, game_id),
+                    stored_pitches(session, game_id))
+
+
+if __name__ == '__main__':
+    main(WATERMARK, update_stored)
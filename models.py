@@ -1,6 +1,7 @@
 from utils import try_int
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, Date, Numeric, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Date, Numeric, DateTime, Boolean, \
+    LargeBinary, ForeignKey, Float
 
 Base = declarative_base()
 
@@ -8,7 +9,8 @@ Base = declarative_base()
 class Game(Base):
     __tablename__ = 'games'
     game_id = Column(String, primary_key=True)
-    game_date = Column(Date, nullable=False)
+    # Indexed so recent games (e.g., of a search) can be read in date order
+    game_date = Column(Date, nullable=False, index=True)
     game_datetime = Column(DateTime)
     season = Column(Integer, nullable=False)
     venue = Column(String, nullable=False, default='')
@@ -90,14 +92,53 @@ class TeamStats(Base):
     era = Column(Numeric)
 
 
+class Player(Base):
+    # One row per player, with the player's most recent names and the date
+    # of the game they were first seen in. Other names only replace them if
+    # their game is later than that date, so games loaded out of order
+    # (e.g., an earlier season) don't. Per-game tables store only the
+    # player_id.
+    __tablename__ = 'players'
+    __table_args__ = {'info': {'merge': {
+        'assignments': {'name': '{new}.name',
+                        'full_name': '{new}.full_name',
+                        'names_since': '{new}.names_since'},
+        'where': ('({old}.name <> {new}.name OR '
+                  '{old}.full_name <> {new}.full_name) AND '
+                  '({old}.names_since IS NULL OR '
+                  '{old}.names_since < {new}.names_since)')}}}
+    player_id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, default='')
+    full_name = Column(String, nullable=False, default='')
+    names_since = Column(Date)
+
+    def __repr__(self):
+        return("<{}>".format(self.full_name))
+
+
+class PlayerName(Base):
+    # Every name a player has been listed under, with the date of the
+    # earliest game loaded under that name, whatever order games are loaded
+    # in
+    __tablename__ = 'player_names'
+    __table_args__ = {'info': {'merge': {
+        'assignments': {'first_game_date': '{new}.first_game_date'},
+        'where': ('{old}.first_game_date IS NULL OR '
+                  '{new}.first_game_date < {old}.first_game_date')}}}
+    player_id = Column(Integer, ForeignKey('players.player_id'),
+                       primary_key=True)
+    name = Column(String, primary_key=True, default='')
+    full_name = Column(String, primary_key=True, default='')
+    first_game_date = Column(Date)
+
+
 class Pitcher(Base):
     __tablename__ = 'pitchers'
 
-    pitcher_id = Column(Integer, primary_key=True)
+    pitcher_id = Column(Integer, ForeignKey('players.player_id'),
+                        primary_key=True)
     game_id = Column(String, primary_key=True)
     team_id = Column(Integer)
-    name = Column(String, nullable=False, default='')
-    full_name = Column(String, nullable=False, default='')
     position = Column(String, nullable=False, default='')
     outs = Column(Integer)
     batters_faced = Column(Integer)
@@ -132,9 +173,8 @@ class Batter(Base):
     __tablename__ = 'batters'
     game_id = Column(String, primary_key=True)
     team_id = Column(Integer, primary_key=True)
-    batter_id = Column(Integer, primary_key=True)
-    name = Column(String, nullable=False, default='')
-    full_name = Column(String, nullable=False, default='')
+    batter_id = Column(Integer, ForeignKey('players.player_id'),
+                       primary_key=True)
     # Hitting
     avg = Column(Numeric)
     batting_order = Column(Integer)
@@ -179,8 +219,8 @@ class AtBat(Base):
     strikes = Column(Integer)
     outs = Column(Integer)
     start_time = Column(DateTime)
-    batter_id = Column(Integer)
-    pitcher_id = Column(Integer)
+    batter_id = Column(Integer, index=True)
+    pitcher_id = Column(Integer, index=True)
     stands = Column(String, nullable=False, default='')
     p_throws = Column(String, nullable=False, default='')
     description = Column(String, nullable=False, default='')
@@ -242,3 +282,60 @@ class Runner(Base):
     score = Column(Boolean)
     rbi = Column(Boolean)
     earned = Column(Boolean)
+
+
+class PitchLocationGrid(Base):
+    # Pitch locations binned into a fixed grid, per pitcher or batter, season,
+    # pitch type and batter handedness. See heatmaps.py.
+    __tablename__ = 'pitch_location_grids'
+    player_id = Column(Integer, primary_key=True)
+    role = Column(String, primary_key=True)
+    season = Column(Integer, primary_key=True)
+    pitch_type = Column(String, primary_key=True)
+    stands = Column(String, primary_key=True)
+    pitches = Column(Integer, nullable=False, default=0)
+    counts = Column(LargeBinary, nullable=False)
+
+
+class IndexWatermark(Base):
+    # The last position (e.g., pitch_id) of a game added to a precomputed
+    # index, so the index can be updated incrementally each time the game is
+    # reloaded.
+    __tablename__ = 'index_watermarks'
+    name = Column(String, primary_key=True)
+    game_id = Column(String, primary_key=True)
+    position = Column(Integer, nullable=False)
+
+
+class Matchup(Base):
+    # Plate appearance outcomes of a batter against a pitcher. See
+    # matchups.py.
+    __tablename__ = 'matchups'
+    batter_id = Column(Integer, primary_key=True)
+    pitcher_id = Column(Integer, primary_key=True)
+    plate_appearances = Column(Integer, nullable=False, default=0)
+    at_bats = Column(Integer, nullable=False, default=0)
+    hits = Column(Integer, nullable=False, default=0)
+    singles = Column(Integer, nullable=False, default=0)
+    doubles = Column(Integer, nullable=False, default=0)
+    triples = Column(Integer, nullable=False, default=0)
+    home_runs = Column(Integer, nullable=False, default=0)
+    walks = Column(Integer, nullable=False, default=0)
+    strikeouts = Column(Integer, nullable=False, default=0)
+    hit_by_pitch = Column(Integer, nullable=False, default=0)
+
+
+class MatchupPitchType(Base):
+    # Pitch results of a batter against a pitcher, by pitch type. Speeds is
+    # the number of pitches with a start speed, summed in speed_total.
+    __tablename__ = 'matchup_pitch_types'
+    batter_id = Column(Integer, primary_key=True)
+    pitcher_id = Column(Integer, primary_key=True)
+    pitch_type = Column(String, primary_key=True)
+    pitches = Column(Integer, nullable=False, default=0)
+    strikes = Column(Integer, nullable=False, default=0)
+    balls = Column(Integer, nullable=False, default=0)
+    in_play = Column(Integer, nullable=False, default=0)
+    whiffs = Column(Integer, nullable=False, default=0)
+    speeds = Column(Integer, nullable=False, default=0)
+    speed_total = Column(Float, nullable=False, default=0.0)
@@ -0,0 +1,275 @@
+"""Live game update notifications.
+
+GameLoader publishes a game's game_id each time it commits the game's rows.
+On PostgreSQL, that's a NOTIFY on the CHANNEL channel, sent within the write
+transaction so it's only delivered if the rows are committed, to every
+process LISTENing. On other backends, notifications are delivered within the
+process by local_broker, so only games loaded in the web app's own process
+(e.g., eagerly) are seen.
+
+In the web app, a single GameUpdates thread listens for notifications and,
+for each game being watched, reads the game's score and newly completed
+at-bats once per notification, and pushes them to every subscriber. Database
+reads scale with the number of updates rather than the number of viewers.
+
+"""
+
+import logging
+import queue
+import select
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event, func
+
+from backends import backend_for
+from models import Game, AtBat
+
+CHANNEL = 'game_updates'
+
+SCORE_COLUMNS = ('status', 'inning', 'top_inning', 'outs', 'home_team_runs',
+                 'away_team_runs', 'home_team_hits', 'away_team_hits',
+                 'home_team_errors', 'away_team_errors')
+AT_BAT_COLUMNS = ('at_bat_number', 'inning', 'inning_half', 'batter_id',
+                  'pitcher_id', 'event', 'description', 'home_team_runs',
+                  'away_team_runs')
+
+
+class LocalBroker(object):
+    """Delivers notifications to subscribers within the process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues = []
+
+    def subscribe(self):
+        q = queue.Queue()
+        with self._lock:
+            self._queues.append(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._queues.remove(q)
+
+    def publish(self, payload):
+        with self._lock:
+            queues = list(self._queues)
+        for q in queues:
+            q.put(payload)
+
+
+local_broker = LocalBroker()
+
+
+def _uses_notify(bind):
+    return backend_for(bind).name == 'postgresql'
+
+
+def publish(session, game_id):
+    """Notify listeners that a game's rows changed, once the session's
+    transaction commits."""
+    if _uses_notify(session.get_bind()):
+        session.execute(func.pg_notify(CHANNEL, game_id).select())
+    else:
+        event.listen(session, 'after_commit',
+                     lambda session: local_broker.publish(game_id), once=True)
+
+
+def listen(bind, timeout=1.0):
+    """Generate the game_ids of notifications as they arrive, or None if none
+    arrive within timeout seconds (so the caller can stop listening). None
+    is also generated first, once listening has started."""
+    if _uses_notify(bind):
+        # A dedicated connection, kept out of the pool, in autocommit mode
+        # so notifications are received outside of a transaction
+        conn = bind.raw_connection()
+        conn.detach()
+        dbapi_conn = conn.connection
+        try:
+            dbapi_conn.autocommit = True
+            cursor = dbapi_conn.cursor()
+            cursor.execute('LISTEN {}'.format(CHANNEL))
+            cursor.close()
+            yield None
+            while True:
+                if select.select([dbapi_conn], [], [], timeout) == \
+                        ([], [], []):
+                    yield None
+                    continue
+                dbapi_conn.poll()
+                while dbapi_conn.notifies:
+                    yield dbapi_conn.notifies.pop(0).payload
+        finally:
+            conn.close()
+    else:
+        q = local_broker.subscribe()
+        try:
+            yield None
+            while True:
+                try:
+                    yield q.get(timeout=timeout)
+                except queue.Empty:
+                    yield None
+        finally:
+            local_broker.unsubscribe(q)
+
+
+def read_update(session, game_id, after):
+    """Read a game's score and the at-bats completed after at-bat number
+    after (or all of them, if after is None).
+
+    Returns:
+        Dictionary of the game's SCORE_COLUMNS, with a list of the at-bats'
+        AT_BAT_COLUMNS under 'at_bats'
+
+    """
+    game = session.query(*[getattr(Game, c) for c in SCORE_COLUMNS]).filter(
+        Game.game_id == game_id).first()
+    update = dict(zip(SCORE_COLUMNS, game or [None] * len(SCORE_COLUMNS)))
+    at_bats = session.query(*[getattr(AtBat, c) for c in AT_BAT_COLUMNS]) \
+        .filter((AtBat.game_id == game_id) & (AtBat.event != ''))
+    if after is not None:
+        at_bats = at_bats.filter(AtBat.at_bat_number > after)
+    update['at_bats'] = [dict(zip(AT_BAT_COLUMNS, row)) for row in
+                         at_bats.order_by(AtBat.at_bat_number)]
+    return update
+
+
+class GameUpdates(object):
+    """Pushes watched games' score changes and new at-bats to subscribers.
+
+    The listening thread is started by the first subscription. The first
+    update in a subscriber's queue is the game's current state, a dictionary
+    like read_update's with all of its completed at-bats. Each following
+    update has only the at-bats completed since the previous one.
+
+    Args:
+        session_factory: Callable returning a new session
+        timeout: Seconds between checks of whether to stop listening
+
+    """
+
+    def __init__(self, session_factory, timeout=1.0):
+        self.session_factory = session_factory
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(list)
+        # game_id -> state of the game as last pushed, like read_update's
+        # with all of the pushed at-bats. Replaced, never modified, so it
+        # can be put in subscribers' queues.
+        self._state = {}
+        self._thread = None
+        self._stop = threading.Event()
+        self._listening = threading.Event()
+
+    def subscribe(self, game_id):
+        """Subscribe to a game's updates, returning a queue of updates."""
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._listening.clear()
+                self._thread = threading.Thread(target=self._run,
+                                                name='GameUpdates')
+                self._thread.daemon = True
+                self._thread.start()
+        # Don't miss notifications sent while the thread starts. The lock
+        # isn't held while waiting or reading, so other subscribers and the
+        # thread's pushes aren't held up.
+        self._listening.wait(self.timeout * 10)
+        q = queue.Queue()
+        state = None
+        while True:
+            with self._lock:
+                # Recheck, since another subscriber may have stored the
+                # game's state (or the last one left) since the last check
+                stored = game_id not in self._state and state is not None
+                if stored:
+                    self._state[game_id] = state
+                if game_id in self._state:
+                    # Start the subscriber from the game's current state.
+                    # Updates are put under the lock, so none is missed or
+                    # put before it.
+                    q.put(self._state[game_id])
+                    self._subscribers[game_id].append(q)
+                    break
+            # Only the first viewer of a game reads its state
+            state = self._read(game_id, None)
+        if stored:
+            # Notifications sent while the state was read were ignored, as
+            # the game wasn't watched yet, so push anything they changed
+            self._push(game_id)
+        return q
+
+    def unsubscribe(self, game_id, q):
+        with self._lock:
+            subscribers = self._subscribers.get(game_id, [])
+            if q in subscribers:
+                subscribers.remove(q)
+            if not subscribers:
+                self._subscribers.pop(game_id, None)
+                self._state.pop(game_id, None)
+
+    def close(self):
+        """Stop listening, within timeout seconds."""
+        self._stop.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _read(self, game_id, after):
+        session = self.session_factory()
+        try:
+            return read_update(session, game_id, after)
+        finally:
+            session.close()
+
+    def _run(self):
+        session = self.session_factory()
+        try:
+            bind = session.get_bind()
+        finally:
+            session.close()
+        notifications = listen(bind, self.timeout)
+        try:
+            for game_id in notifications:
+                self._listening.set()
+                if self._stop.is_set():
+                    break
+                if game_id is not None:
+                    self._push(game_id)
+        finally:
+            notifications.close()
+
+    def _push(self, game_id):
+        # Read and push a game's update, if it's being watched and changed.
+        # Pushes from the listening thread and from subscribe may overlap:
+        # if another push stores a newer state while this one reads, this
+        # one reads again after it, rather than pushing the same at-bats
+        # twice or dropping rows only it read.
+        while True:
+            with self._lock:
+                state = self._state.get(game_id)
+            if state is None:
+                # Nobody is watching the game
+                return
+            at_bats = state['at_bats']
+            try:
+                update = self._read(game_id, at_bats[-1]['at_bat_number']
+                                    if at_bats else None)
+            except Exception:
+                logging.exception('Reading the update of {} failed'.format(
+                    game_id))
+                return
+            with self._lock:
+                if self._state.get(game_id) is not state:
+                    continue
+                if not update['at_bats'] and \
+                        all(update[c] == state[c] for c in SCORE_COLUMNS):
+                    return
+                self._state[game_id] = dict(
+                    update, at_bats=at_bats + update['at_bats'])
+                for q in self._subscribers[game_id]:
+                    q.put(update)
+                return
@@ -0,0 +1,96 @@
+"""Players dimension.
+
+Player names are stored once per player in the players table (and once per
+name in player_names), rather than in every batters and pitchers row. The
+players table keeps each player's most recent names, with names_since, the
+date of the game they were first seen in, and player_names the date of the
+earliest game loaded under each name. New names only replace a player's
+names if their game is later than names_since, so games can be loaded in any
+order (e.g., a backfill of an earlier season).
+
+Each game's boxscore still lists every player, so the writing process keeps
+a cache of the rows it has written. It only writes a player's row if the
+player is new to it, or is listed under other names in a game later than
+those of the row it wrote, so a player's row is written once, and again only
+when their names change. Likewise, it only writes a name if it hasn't
+written it with an earlier or equal date.
+
+"""
+
+from models import Player, PlayerName
+
+# player_id -> row of the players table written by this process,
+# (player_id, name, full_name, names_since)
+_written = {}
+# (player_id, name, full_name) -> earliest first_game_date written by this
+# process
+_first_dates = {}
+
+
+def _replaces(row, written):
+    # Would a players row replace the one written, as the table's merge
+    # rule decides?
+    return written is None or (row[1:3] != written[1:3] and
+                               row[3] > written[3])
+
+
+def unwritten(rows):
+    """Filter rows of the players table to those that may change it, given
+    the rows written by this process. Duplicate rows are dropped."""
+    by_id = dict((row[0], row) for row in rows)
+    return [row for player_id, row in by_id.items()
+            if _replaces(row, _written.get(player_id))]
+
+
+def unwritten_names(rows):
+    """Rows of the player_names table for rows of the players table, keeping
+    only names not yet written by this process with the same or an earlier
+    date."""
+    by_key = dict((row[:3], row) for row in rows)
+    return [row for key, row in by_key.items()
+            if key not in _first_dates or row[3] < _first_dates[key]]
+
+
+def remember(written):
+    """Record the rows returned by player_tables as written, once they're
+    committed."""
+    players, names = written
+    for row in players:
+        if _replaces(row, _written.get(row[0])):
+            _written[row[0]] = row
+    for row in names:
+        first = _first_dates.get(row[:3])
+        if first is None or row[3] < first:
+            _first_dates[row[:3]] = row[3]
+
+
+def forget():
+    """Clear the cache, e.g., after the tables are reset."""
+    _written.clear()
+    _first_dates.clear()
+
+
+def player_tables(tables):
+    """Replace the players rows of a game's tables with those that may change
+    the players table, and add the player_names rows that may change it.
+
+    Args:
+        tables: List of (table, rows) tuples in dependency order. Players
+            rows carry the game's date as their names_since.
+
+    Returns:
+        Tuple of the new list of (table, rows) tuples and the rows to pass
+        to remember once they're committed
+
+    """
+    out = []
+    players, names = [], []
+    for table, rows in tables:
+        if table is Player.__table__:
+            players = unwritten(rows)
+            names = unwritten_names(rows)
+            out.append((table, players))
+            out.append((PlayerName.__table__, names))
+        else:
+            out.append((table, rows))
+    return out, (players, names)
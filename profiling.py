@@ -0,0 +1,152 @@
+#! /usr/bin/env python
+"""Opt-in cProfile hooks for game loads.
+
+Profiling is off unless config.PROFILE_DIR is set (usually through the
+BREAKINGBALL_PROFILE_DIR environment variable of a celery worker). Each
+profiled stage of a game load is dumped to its own file in that directory,
+named '<game_id>.<stage>.<pid>.<timestamp>.prof'.
+
+cProfile profiles one block per process at a time: a second profiler in
+another thread (or eventlet green thread) either fails to start or silently
+disrupts the first. Blocks that start while another is being profiled are
+run unprofiled, so with a threaded or green pool only some stages of the
+sampled games are dumped.
+
+To aggregate the dumps from many tasks and list the hottest functions:
+
+    ./profiling.py /tmp/bbprof --stage parse --limit 30
+
+"""
+
+import argparse
+import cProfile
+import glob
+import os
+import pstats
+import logging
+import re
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+import config
+
+# Held while a block is profiled
+_profiling = threading.Lock()
+
+
+def should_profile(game_id, rate=None, pattern=None):
+    """Decide whether a game's load should be profiled.
+
+    Sampling is based on a hash of the game_id rather than a random draw, so
+    every stage of a sampled game is profiled, even when stages run in
+    different processes.
+
+    Args:
+        game_id: MLB GameDay-formatted game_id
+        rate: Fraction of games to profile. Defaults to config.PROFILE_RATE
+        pattern: Regular expression the game_id must match. Defaults to
+            config.PROFILE_GAMES. If None, all game_ids match.
+
+    """
+    rate = config.PROFILE_RATE if rate is None else rate
+    pattern = config.PROFILE_GAMES if pattern is None else pattern
+    if pattern and not re.search(pattern, game_id):
+        return False
+    return zlib.crc32(game_id.encode()) / 2 ** 32 < rate
+
+
+@contextmanager
+def profiled(game_id, stage, profile_dir=None):
+    """Profile the enclosed block if profiling is enabled for this game.
+
+    The block is run unprofiled if another block is being profiled, or if
+    the profiler fails to start: profiling never fails a load.
+
+    Args:
+        game_id: MLB GameDay-formatted game_id
+        stage: Name of the load stage (e.g., 'fetch', 'parse', 'load'), used
+            to tag the dump file
+        profile_dir: Directory for the dumps. Defaults to config.PROFILE_DIR
+
+    """
+    profile_dir = profile_dir or config.PROFILE_DIR
+    if not profile_dir or not should_profile(game_id) or \
+            not _profiling.acquire(blocking=False):
+        yield
+        return
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Another profiler (e.g., outside the loader) is active
+        _profiling.release()
+        logging.warning('Not profiling {} {}: the profiler is in use'.format(
+            game_id, stage))
+        yield
+        return
+    try:
+        yield
+    finally:
+        profile.disable()
+        _profiling.release()
+        filename = '{}.{}.{}.{}.prof'.format(game_id, stage, os.getpid(),
+                                            int(time.time() * 1000))
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            profile.dump_stats(os.path.join(profile_dir, filename))
+        except OSError:
+            logging.exception('Dumping the profile of {} {} failed'.format(
+                game_id, stage))
+
+
+def find_dumps(profile_dir, stage=None, game_pattern=None):
+    """List profile dumps in profile_dir, optionally filtered by stage and a
+    regular expression matched against the game_id."""
+    dumps = []
+    for path in sorted(glob.glob(os.path.join(profile_dir, '*.prof'))):
+        parts = os.path.basename(path).split('.')
+        if len(parts) != 5:
+            continue
+        game_id, dump_stage = parts[0], parts[1]
+        if stage is not None and dump_stage != stage:
+            continue
+        if game_pattern is not None and not re.search(game_pattern, game_id):
+            continue
+        dumps.append(path)
+    return dumps
+
+
+def aggregate(dumps):
+    """Merge a list of profile dumps into a single pstats.Stats object."""
+    stats = pstats.Stats(dumps[0])
+    for path in dumps[1:]:
+        stats.add(path)
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Aggregate profile dumps from load_game tasks')
+    parser.add_argument('profile_dir', help='Directory containing the dumps')
+    parser.add_argument('--stage', help='Only include this stage')
+    parser.add_argument('--game', help='Only include game_ids matching this '
+                        'regular expression')
+    parser.add_argument('--sort', default='cumulative',
+                        help='pstats sort key (default: cumulative)')
+    parser.add_argument('--limit', type=int, default=25,
+                        help='Number of functions to list (default: 25)')
+    parser.add_argument('--output', help='Also write the merged stats to this '
+                        'file, e.g., for snakeviz or gprof2dot')
+    args = parser.parse_args()
+
+    dumps = find_dumps(args.profile_dir, args.stage, args.game)
+    if not dumps:
+        parser.exit(1, 'No matching profile dumps in {}\n'.format(
+            args.profile_dir))
+    print('Aggregating {} profile dumps'.format(len(dumps)))
+    stats = aggregate(dumps)
+    if args.output:
+        stats.dump_stats(args.output)
+    stats.sort_stats(args.sort).print_stats(args.limit)
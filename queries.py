@@ -0,0 +1,172 @@
+"""Streaming, column-oriented queries over pitches and at bats.
+
+Querying the ORM classes builds one object per row, which runs out of memory
+on a season of pitches. The functions here select plain columns through a
+server-side cursor and yield the results in chunks, each chunk a dictionary
+of NumPy arrays keyed by column name (or a NumPy record array), so memory use
+depends on the chunk size rather than the size of the result.
+
+    from queries import stream_pitches
+    for chunk in stream_pitches(season=2015, pitcher_id=453286):
+        speeds = chunk['start_speed']
+
+Missing values are returned as NaN for numeric columns, NaT for dates and
+timestamps, and None for strings. Integer columns that can be NULL are
+returned as floats for that reason.
+
+"""
+
+import numpy as np
+from sqlalchemy import select, and_, or_, exists
+from sqlalchemy import Integer, Numeric, Boolean, Date, DateTime
+from models import Game, AtBat, Pitch
+
+DEFAULT_CHUNK_SIZE = 50000
+
+# Columns available to each query, by name. Pitches carry the context of
+# their at bat and game; names shared between tables are kept from the
+# table being queried.
+PITCH_COLUMNS = [c for c in Pitch.__table__.columns] + [
+    AtBat.batter_id, AtBat.pitcher_id, AtBat.stands, AtBat.p_throws,
+    AtBat.inning, AtBat.inning_half, Game.season, Game.game_date,
+    Game.home_team_id, Game.away_team_id]
+AT_BAT_COLUMNS = [c for c in AtBat.__table__.columns] + [
+    Game.season, Game.game_date, Game.home_team_id, Game.away_team_id]
+
+
+def _matches(column, value):
+    # Filter on a single value or any of a list of values
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return column.in_(list(value))
+    return column == value
+
+
+def _filters(season=None, start_date=None, end_date=None, pitcher_id=None,
+             batter_id=None, team_id=None, pitch_type=None, pitches=True):
+    clauses = []
+    if season is not None:
+        clauses.append(_matches(Game.season, season))
+    if start_date is not None:
+        clauses.append(Game.game_date >= start_date)
+    if end_date is not None:
+        clauses.append(Game.game_date <= end_date)
+    if pitcher_id is not None:
+        clauses.append(_matches(AtBat.pitcher_id, pitcher_id))
+    if batter_id is not None:
+        clauses.append(_matches(AtBat.batter_id, batter_id))
+    if team_id is not None:
+        clauses.append(or_(_matches(Game.home_team_id, team_id),
+                           _matches(Game.away_team_id, team_id)))
+    if pitch_type is not None:
+        if pitches:
+            clauses.append(_matches(Pitch.pitch_type, pitch_type))
+        else:
+            # At bats including at least one pitch of the given type(s)
+            clauses.append(exists().where(and_(
+                Pitch.game_id == AtBat.game_id,
+                Pitch.at_bat_number == AtBat.at_bat_number,
+                _matches(Pitch.pitch_type, pitch_type))))
+    return clauses
+
+
+def _select_columns(available, names):
+    if names is None:
+        return available
+    by_name = dict((c.name, c) for c in reversed(available))
+    unknown = [n for n in names if n not in by_name]
+    if unknown:
+        raise ValueError('Unknown columns: {}'.format(', '.join(unknown)))
+    return [by_name[n] for n in names]
+
+
+def column_array(values, column_type, nullable=True):
+    """Convert a sequence of values from a column of the given SQLAlchemy type
+    to a NumPy array."""
+    n = len(values)
+    if isinstance(column_type, (Numeric, Boolean)) or \
+            (isinstance(column_type, Integer) and nullable):
+        return np.fromiter((np.nan if v is None else float(v) for v in values),
+                           dtype=np.float64, count=n)
+    if isinstance(column_type, Integer):
+        return np.fromiter(values, dtype=np.int64, count=n)
+    if isinstance(column_type, DateTime):
+        return np.array([None if v is None else v.replace(tzinfo=None)
+                         for v in values], dtype='datetime64[us]')
+    if isinstance(column_type, Date):
+        return np.array(values, dtype='datetime64[D]')
+    out = np.empty(n, dtype=object)
+    out[:] = values
+    return out
+
+
+def _stream(columns, clauses, from_clause, order_by, bind, chunk_size,
+            as_records):
+    if bind is None:
+        from db import get_engine
+        bind = get_engine()
+    names = [c.name for c in columns]
+    stmt = select(columns).select_from(from_clause).where(and_(*clauses)) \
+        .order_by(*order_by)
+    conn = bind.connect().execution_options(stream_results=True)
+    try:
+        result = conn.execute(stmt)
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            values = list(zip(*rows))
+            arrays = [column_array(v, c.type, c.nullable)
+                      for v, c in zip(values, columns)]
+            if as_records:
+                yield np.rec.fromarrays(arrays, names=names)
+            else:
+                yield dict(zip(names, arrays))
+        result.close()
+    finally:
+        conn.close()
+
+
+def stream_pitches(columns=None, bind=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                   as_records=False, **filters):
+    """Stream pitches, with the context of their at bat and game, in chunks
+    of column-oriented NumPy arrays.
+
+    Args:
+        columns: List of column names to return. Defaults to all columns in
+            PITCH_COLUMNS
+        bind: SQLAlchemy engine or connection. Defaults to the application's
+            engine
+        chunk_size: Number of rows per chunk
+        as_records: Yield NumPy record arrays instead of dictionaries of
+            arrays?
+        **filters: Any of season, start_date, end_date, pitcher_id,
+            batter_id, team_id (games involving the team) and pitch_type.
+            Each takes a single value or a list of values, except for the
+            dates, which are inclusive bounds on the game date.
+
+    """
+    from_clause = Pitch.__table__.join(
+        AtBat.__table__, and_(Pitch.game_id == AtBat.game_id,
+                              Pitch.at_bat_number == AtBat.at_bat_number)) \
+        .join(Game.__table__, AtBat.game_id == Game.game_id)
+    return _stream(_select_columns(PITCH_COLUMNS, columns),
+                   _filters(pitches=True, **filters), from_clause,
+                   [Pitch.game_id, Pitch.pitch_id], bind, chunk_size,
+                   as_records)
+
+
+def stream_at_bats(columns=None, bind=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                   as_records=False, **filters):
+    """Stream at bats, with the context of their game, in chunks of
+    column-oriented NumPy arrays.
+
+    Takes the same arguments as stream_pitches. Filtering on pitch_type
+    returns at bats including at least one pitch of that type.
+
+    """
+    from_clause = AtBat.__table__.join(Game.__table__,
+                                       AtBat.game_id == Game.game_id)
+    return _stream(_select_columns(AT_BAT_COLUMNS, columns),
+                   _filters(pitches=False, **filters), from_clause,
+                   [AtBat.game_id, AtBat.at_bat_number], bind, chunk_size,
+                   as_records)
@@ -0,0 +1,96 @@
+"""Day-level scoreboard, used by the dispatcher to decide which games to load.
+
+A date's master_scoreboard.xml lists the status, inning and score of every
+game that day. Comparing it against the games table tells the dispatcher
+which games have changed since they were last loaded, with a single request
+per date instead of a load per game.
+
+"""
+
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+from utils import date_to_url, try_int
+
+GameState = namedtuple('GameState', ['status', 'inning', 'top_inning'])
+
+
+def parse_scoreboard(xml_text):
+    """Parse a master_scoreboard.xml document.
+
+    Also accepts miniscoreboard.xml, which lists the same information as
+    attributes of each game element.
+
+    Returns:
+        Dictionary of game_ids and GameStates
+
+    """
+    root = ET.fromstring(xml_text)
+    games = {}
+    for game in root.iter('game'):
+        gameday = game.get('gameday') or game.get('gameday_link')
+        if not gameday:
+            continue
+        # master_scoreboard.xml nests the status in a status element
+        status = game.find('status')
+        if status is None:
+            status = game
+        games['gid_' + gameday] = GameState(
+            status=status.get('status', ''),
+            inning=try_int(status.get('inning')),
+            top_inning=status.get('top_inning', '') == 'Y')
+    return games
+
+
+def fetch_scoreboard(date):
+    """Download and parse the scoreboard for a date.
+
+    Returns:
+        Dictionary of game_ids and GameStates, or None if there's no
+        scoreboard for the date
+
+    """
+    import requests
+    r = requests.get(date_to_url(date) + 'master_scoreboard.xml')
+    if r.status_code != 200:
+        return None
+    try:
+        return parse_scoreboard(r.content)
+    except ET.ParseError:
+        return None
+
+
+def stored_states(session, date):
+    """Query the GameStates of the games loaded for a date."""
+    from models import Game
+    rows = session.query(Game.game_id, Game.status, Game.inning,
+                         Game.top_inning).filter(Game.game_date == date)
+    return dict((game_id, GameState(status, inning, bool(top_inning)))
+                for game_id, status, inning, top_inning in rows)
+
+
+def games_to_load(scoreboard, stored):
+    """Game_ids whose status or inning differ from what's stored, or that
+    haven't been loaded at all.
+
+    Args:
+        scoreboard: Dictionary of game_ids and GameStates, from the
+            scoreboard
+        stored: Dictionary of game_ids and GameStates, from the database
+
+    """
+    return sorted(gid for gid, state in scoreboard.items()
+                  if stored.get(gid) != state)
+
+
+def not_final(game_ids, stored):
+    """Game_ids that aren't stored with a status of 'Final', for dates
+    without a scoreboard.
+
+    Args:
+        game_ids: Listed game_ids
+        stored: Dictionary of game_ids and GameStates, from the database
+
+    """
+    return [gid for gid in game_ids
+            if gid not in stored or stored[gid].status != 'Final']
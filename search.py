@@ -0,0 +1,148 @@
+"""Text search over play-by-play descriptions.
+
+Finds at-bats by their event and description (e.g., "grand slam" or "picked
+off"), or pitches by their description, with the context of their game. On
+PostgreSQL, searches use full text search, backed by GIN indexes created
+with:
+
+    ./db.py search-index
+
+Other backends fall back to a case-insensitive LIKE of each word, which scans
+the tables.
+
+Matches are paged with a cursor, the (game_date, game_id, number) of the
+last match of the previous page, where number is the at-bat number or pitch
+id. Each page starts right after the cursor, rather than skipping all the
+matches of the previous pages with an OFFSET, so later pages cost no more
+than the first.
+
+"""
+
+import datetime as dt
+
+from sqlalchemy import and_, or_
+
+from backends import backend_for
+from models import Game, AtBat, Pitch
+
+# Searchable tables and their text columns
+SEARCHABLE = {
+    'at_bats': (AtBat, ('event', 'description')),
+    'pitches': (Pitch, ('description',)),
+}
+MAX_PER_PAGE = 100
+
+
+def create_indexes(bind):
+    """Create the indexes backing text search, if the backend has any.
+
+    Returns:
+        Number of indexes created (or that already existed)
+
+    """
+    backend = backend_for(bind)
+    statements = []
+    for model, columns in SEARCHABLE.values():
+        table = model.__table__
+        statements.extend(backend.text_search_indexes(
+            table, [table.c[name] for name in columns]))
+    with bind.begin() as conn:
+        for statement in statements:
+            conn.execute(statement)
+    return len(statements)
+
+
+def format_cursor(cursor):
+    """Format a cursor returned by search_plays as a string, e.g., for a
+    URL parameter."""
+    game_date, game_id, number = cursor
+    return '{},{},{}'.format(game_date.isoformat(), game_id, number)
+
+
+def parse_cursor(value):
+    """Parse a cursor formatted by format_cursor, raising ValueError if it's
+    invalid."""
+    parts = value.split(',')
+    if len(parts) != 3:
+        raise ValueError('Invalid cursor: {}'.format(value))
+    game_date, game_id, number = parts
+    return (dt.datetime.strptime(game_date, '%Y-%m-%d').date(), game_id,
+            int(number))
+
+
+def _number(kind):
+    # Column identifying a match within its game
+    return AtBat.at_bat_number if kind == 'at_bats' else Pitch.pitch_id
+
+
+def _after(kind, cursor):
+    # Matches after the cursor, in the query's order: (game_date DESC,
+    # game_id, number)
+    game_date, game_id, number = cursor
+    model = SEARCHABLE[kind][0]
+    return or_(Game.game_date < game_date,
+               and_(Game.game_date == game_date,
+                    or_(model.game_id > game_id,
+                        and_(model.game_id == game_id,
+                             _number(kind) > number))))
+
+
+def _query(session, kind):
+    # Columns of each match, with its game's context
+    game_columns = (Game.game_id, Game.game_date, Game.venue,
+                    Game.home_team_id, Game.away_team_id)
+    at_bat_columns = (AtBat.at_bat_number, AtBat.inning, AtBat.inning_half,
+                      AtBat.batter_id, AtBat.pitcher_id, AtBat.event,
+                      AtBat.home_team_runs, AtBat.away_team_runs)
+    if kind == 'at_bats':
+        return session.query(*(game_columns + at_bat_columns +
+                               (AtBat.description,))) \
+            .select_from(AtBat) \
+            .join(Game, AtBat.game_id == Game.game_id) \
+            .order_by(Game.game_date.desc(), AtBat.game_id,
+                      AtBat.at_bat_number)
+    return session.query(*(game_columns + at_bat_columns +
+                           (Pitch.pitch_id, Pitch.description,
+                            Pitch.pitch_type))) \
+        .select_from(Pitch) \
+        .join(AtBat, and_(Pitch.game_id == AtBat.game_id,
+                          Pitch.at_bat_number == AtBat.at_bat_number)) \
+        .join(Game, Pitch.game_id == Game.game_id) \
+        .order_by(Game.game_date.desc(), Pitch.game_id, Pitch.pitch_id)
+
+
+def search_plays(session, q, kind='at_bats', after=None, per_page=25):
+    """Search at-bats or pitches, most recent games first.
+
+    Args:
+        session: SQLAlchemy session
+        q: Words that must all appear in a play's text
+        kind: 'at_bats' or 'pitches'
+        after: Cursor of the previous page, or None for the first page
+        per_page: Matches per page, up to MAX_PER_PAGE
+
+    Returns:
+        Tuple of a list of dictionaries, one per match, and the cursor of
+        the next page (None if it's the last)
+
+    """
+    if kind not in SEARCHABLE:
+        raise ValueError('Unknown kind of play: {}'.format(kind))
+    if not q.split():
+        return [], None
+    per_page = min(max(per_page, 1), MAX_PER_PAGE)
+    model, columns = SEARCHABLE[kind]
+    clause = backend_for(session.get_bind()).text_search(
+        [getattr(model, name) for name in columns], q)
+    query = _query(session, kind).filter(clause)
+    if after is not None:
+        query = query.filter(_after(kind, after))
+    # Fetch one extra match to tell if there's another page, rather than
+    # counting every match
+    rows = query.limit(per_page + 1).all()
+    plays = [row._asdict() for row in rows[:per_page]]
+    if len(rows) <= per_page:
+        return plays, None
+    last = plays[-1]
+    number = last['at_bat_number'] if kind == 'at_bats' else last['pitch_id']
+    return plays, (last['game_date'], last['game_id'], number)
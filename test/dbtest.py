@@ -0,0 +1,18 @@
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base
+
+
+class SQLiteTestCase(unittest.TestCase):
+    """Test case with the tables created in a fresh in-memory SQLite database,
+    as self.engine, and a session bound to it, as self.session."""
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
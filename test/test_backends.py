@@ -0,0 +1,68 @@
+import unittest
+from sqlalchemy import select
+from models import Base, Team, Matchup
+from backends import get_backend, backend_for, rows_from_instances, \
+    SQLiteBackend, PostgreSQLBackend
+
+
+class TestBackends(unittest.TestCase):
+    def setUp(self):
+        self.backend = get_backend('sqlite://')
+        self.engine = self.backend.create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+
+    def test_get_backend(self):
+        self.assertIsInstance(get_backend('postgresql:///breakingball'),
+                              PostgreSQLBackend)
+        self.assertIsInstance(get_backend('postgresql+psycopg2://localhost/bb'),
+                              PostgreSQLBackend)
+        self.assertIsInstance(backend_for(self.engine), SQLiteBackend)
+        with self.assertRaises(ValueError):
+            get_backend('oracle://scott@localhost')
+
+    def test_rows_from_instances(self):
+        tables = rows_from_instances([
+            Team(team_id=113, season=2015, name='Cincinnati',
+                 short_name='Reds'),
+            Team(team_id=113, season=2015, name='Cincinnati',
+                 short_name='Cincinnati'),
+        ])
+        self.assertEqual(len(tables), 1)
+        table, rows = tables[0]
+        self.assertIs(table, Team.__table__)
+        # Duplicate keys are collapsed and defaults filled in
+        self.assertEqual(rows, [(113, 2015, 'Cincinnati', 'Cincinnati', '',
+                                 '')])
+
+    def test_upsert(self):
+        team = Team.__table__
+        with self.engine.begin() as conn:
+            self.backend.upsert(conn, team, [(113, 2015, 'Cincinnati', 'Reds',
+                                              'N', 'C')])
+            self.backend.upsert(conn, team, [(113, 2015, 'Cincinnati', 'CIN',
+                                              'N', 'C')])
+        with self.engine.connect() as conn:
+            names = [r.short_name for r in conn.execute(select([team]))]
+        self.assertEqual(names, ['CIN'])
+
+    def test_merge(self):
+        table = Matchup.__table__
+        add = dict((c.name, '{{old}}.{0} + {{new}}.{0}'.format(c.name))
+                   for c in table.columns if not c.primary_key)
+        with self.engine.begin() as conn:
+            self.backend.merge(conn, table, [(20, 10) + (1,) * 10,
+                                             (21, 10) + (1,) * 10], add)
+            self.backend.merge(conn, table, [(20, 10) + (2,) * 10], add)
+            # Rows are only updated where the condition holds
+            self.backend.merge(conn, table, [(21, 10) + (5,) * 10], add,
+                               where='{old}.hits > {new}.hits')
+        with self.engine.connect() as conn:
+            hits = dict((r.batter_id, r.hits) for r in
+                        conn.execute(select([table])))
+        self.assertEqual(hits, {20: 3, 21: 1})
+
+    def tearDown(self):
+        self.engine.dispose()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from models import Batter
+from fieldmaps import FieldMap, PLAYERS, BATTERS, PITCHERS, PITCHES, AT_BATS, \
+    INT, FLOAT
+from utils import try_int, try_float
+
+
+class TestFieldMaps(unittest.TestCase):
+    def test_conversions_match_utils(self):
+        fieldmap = FieldMap(Batter, [('at_bats', 'ab', INT),
+                                     ('avg', 'avg', FLOAT)])
+        at_bats = fieldmap.index('at_bats')
+        avg = fieldmap.index('avg')
+        for text in ['3', '-2', '', ' 7 ', '3.5', '.293', 'text', None]:
+            row = fieldmap.convert({'ab': text, 'avg': text})
+            self.assertEqual(row[at_bats], try_int(text))
+            self.assertEqual(row[avg], try_float(text))
+
+    def test_batter_row(self):
+        row = BATTERS.convert({'id': '545361', 'ab': '4', 'avg': '.293'},
+                              game_id='gid_2015_05_09_houmlb_anamlb_1',
+                              team_id=108)
+        self.assertEqual(len(row), len(Batter.__table__.columns))
+        values = dict(zip(BATTERS.columns, row))
+        self.assertEqual(values['batter_id'], 545361)
+        self.assertEqual(values['team_id'], 108)
+        self.assertEqual(values['at_bats'], 4)
+        self.assertEqual(values['avg'], .293)
+        self.assertIsNone(values['hits'])
+
+    def test_player_row(self):
+        # Missing values get the column default
+        self.assertEqual(PLAYERS.convert({'id': '545361', 'name': 'Trout'}),
+                         (545361, 'Trout', '', None))
+
+    def test_flag_and_context(self):
+        row = AT_BATS.convert({'score': 'T'}, at_bat_number=5)
+        self.assertTrue(row[AT_BATS.index('score')])
+        self.assertEqual(row[AT_BATS.index('at_bat_number')], 5)
+        self.assertEqual(row[AT_BATS.index('inning_half')], '')
+        row = AT_BATS.convert({})
+        self.assertFalse(row[AT_BATS.index('score')])
+
+    def test_pitching_decisions(self):
+        # boxscore.xml flags decisions with 'true'; missing means False
+        row = PITCHERS.convert({'win': 'true', 'save': 'false'})
+        self.assertIs(row[PITCHERS.index('win')], True)
+        self.assertIs(row[PITCHERS.index('save')], False)
+        self.assertIs(row[PITCHERS.index('loss')], False)
+
+    def test_pitch_attribute_names(self):
+        row = PITCHES.convert({'sz_bot': '1.59'}, pitch_id=1)
+        self.assertEqual(row[PITCHES.index('sz_bottom')], 1.59)
+
+    def test_invalid_fields(self):
+        with self.assertRaises(ValueError):
+            FieldMap(Batter, [('nope', 'x', INT)])
+        with self.assertRaises(ValueError):
+            FieldMap(Batter, [('hits', 'h', 'complex')])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import datetime as dt
+import os
+import sys
+import threading
+import unittest
+import requests
+import config
+from gameloader import GameLoader
+from utils import fetch_game_listings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+from gameday_server import GameDayServer  # noqa: E402
+
+FIXTURES = os.path.join(ROOT, 'test', 'fixtures', 'gameday')
+GID = 'gid_2015_05_09_cinmlb_chamlb_1'
+
+
+class TestGameDayServer(unittest.TestCase):
+    def setUp(self):
+        self.server = GameDayServer(FIXTURES, port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.gameday_url = config.GAMEDAY_URL
+        config.GAMEDAY_URL = self.server.url
+
+    def tearDown(self):
+        config.GAMEDAY_URL = self.gameday_url
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_listing(self):
+        self.assertEqual(fetch_game_listings(dt.date(2015, 5, 9)),
+                         ['gid_2015_05_09_anamlb_houmlb_1', GID])
+
+    def test_fetch(self):
+        game = GameLoader(GID)
+        game.fetch_all()
+        documents = game.documents
+        self.assertIn('<boxscore', documents['boxscore'])
+        self.assertEqual(documents['innings'].count('<inning '), 2)
+        self.assertEqual(self.server.failed_games(), set())
+        # The game's first request is recorded, to time its load
+        self.assertEqual(list(self.server.started_games()), [GID])
+
+    def test_missing_document(self):
+        # Documents that aren't published yet are empty
+        game = GameLoader(GID)
+        self.assertEqual(game.fetch(game.base_url + 'missing.xml'), '')
+
+    def test_simulated_errors(self):
+        self.server.error_rate = 1.0
+        with self.assertRaises(requests.HTTPError):
+            GameLoader(GID).fetch_all()
+        self.assertEqual(self.server.failed_games(), set([GID]))
+
+
+if __name__ == '__main__':
+    unittest.main()
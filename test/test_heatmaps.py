@@ -0,0 +1,41 @@
+import unittest
+import numpy as np
+from dbtest import SQLiteTestCase
+from heatmaps import bin_locations, encode_grid, decode_grid, update_grids, \
+    get_grid, GRID_BINS
+
+
+class TestHeatmaps(SQLiteTestCase):
+    def test_bin_locations(self):
+        counts = bin_locations([0.0, 5.0, 249.0, 300.0], [0.0, 5.0, 249.0, 1.0])
+        self.assertEqual(counts.shape, (GRID_BINS, GRID_BINS))
+        self.assertEqual(counts[0, 0], 2)
+        self.assertEqual(counts[-1, -1], 1)
+        self.assertEqual(counts.sum(), 3)
+
+    def test_encode_decode(self):
+        counts = bin_locations([10.0, 20.0], [30.0, 40.0])
+        np.testing.assert_array_equal(decode_grid(encode_grid(counts)), counts)
+
+    def test_update_grids_is_incremental(self):
+        gid = 'gid_2015_05_09_cinmlb_chamlb_1'
+        first = [(1, 10, 20, 'R', 'FF', 100.0, 100.0),
+                 (2, 10, 20, 'R', 'SL', 120.0, 150.0)]
+        update_grids(self.session, gid, 2015, first)
+        self.session.commit()
+        # Reloading the game with one new pitch only adds the new pitch
+        update_grids(self.session, gid, 2015,
+                     first + [(3, 10, 21, 'L', 'FF', 90.0, 90.0)])
+        self.session.commit()
+
+        counts, pitches = get_grid(self.session, 'pitcher', 10, 2015)
+        self.assertEqual(pitches, 3)
+        self.assertEqual(counts.sum(), 3)
+        counts, pitches = get_grid(self.session, 'pitcher', 10, 2015,
+                                   pitch_type='FF', stands='R')
+        self.assertEqual(pitches, 1)
+        counts, pitches = get_grid(self.session, 'batter', 21, 2015)
+        self.assertEqual(pitches, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,22 +1,59 @@
+import os
+import sys
+import threading
 import unittest
-from sqlalchemy import create_engine
+from urllib.parse import urljoin
 from sqlalchemy.orm import sessionmaker
-from models import Base, Game, Pitch
+from models import Base, Game, Pitch, Pitcher, Player
 import config
+from backends import get_backend
 from gameloader import GameLoader
+import players
+from utils import gid_to_url
 import datetime as dt
 
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+from gameday_server import GameDayServer  # noqa: E402
+
+# Recorded (synthetic) GameDay data of one game
+FIXTURES = os.path.join(ROOT, 'test', 'fixtures', 'gameday')
+# GameDay data recorded from the real site, with:
+#     bench/gameday_server.py record test/fixtures/recorded \
+#         --start-date 2015-05-09
+#     bench/gameday_server.py record test/fixtures/recorded \
+#         --start-date 2008-06-08
+RECORDED = os.path.join(ROOT, 'test', 'fixtures', 'recorded')
+RECORDED_GAMES = ('gid_2015_05_09_cinmlb_chamlb_1',
+                  'gid_2008_06_08_balmlb_tormlb_1')
+
+
+def recorded(root, game_id):
+    # Has a game been recorded into root?
+    return os.path.isdir(os.path.join(
+        root, gid_to_url(game_id)[len(config.GAMEDAY_URL):]))
+
 
 # TODO: Mock a few game objects with pre-downloaded XML so we can extensively
 # test various loading scenarios
 # TODO: Add test for gid_2005_03_18_arimlb_colmlb_1 to ensure we increment pitch
 # ID where it doesn't exist
 
+@unittest.skipUnless(all(recorded(RECORDED, gid) for gid in RECORDED_GAMES),
+                     'Games not recorded into {}'.format(RECORDED))
 class TestGameLoader(unittest.TestCase):
+    # Loads real games, served by the local GameDay stand-in, into the test
+    # database
     def setUp(self):
+        self.server = GameDayServer(RECORDED, port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.gameday_url = config.GAMEDAY_URL
+        config.GAMEDAY_URL = self.server.url
         url = config.DB_TEST_URL
-        self.engine = create_engine(url)
+        self.engine = get_backend(url).create_engine(url)
         self.sessionmaker = sessionmaker(bind=self.engine)
+        # The fresh database has none of the players this process cached
+        players.forget()
         Base.metadata.drop_all(self.engine)
         Base.metadata.create_all(self.engine)
         self.newgame = GameLoader('gid_2015_05_09_cinmlb_chamlb_1',
@@ -31,8 +68,9 @@ class TestGameLoader(unittest.TestCase):
         self.assertEqual(self.oldgame.game_date, dt.date(2008, 6, 8))
         self.assertEqual(self.newgame.season, 2015)
         self.assertEqual(self.newgame.base_url,
-                         ('http://gd2.mlb.com/components/game/mlb/year_2015/'
-                          'month_05/day_09/gid_2015_05_09_cinmlb_chamlb_1/'))
+                         urljoin(config.GAMEDAY_URL,
+                                 'year_2015/month_05/day_09/'
+                                 'gid_2015_05_09_cinmlb_chamlb_1/'))
 
     def test_both_games_loaded(self):
         s = self.sessionmaker()
@@ -47,8 +85,50 @@ class TestGameLoader(unittest.TestCase):
         s.close()
 
     def tearDown(self):
+        config.GAMEDAY_URL = self.gameday_url
+        self.server.shutdown()
+        self.server.server_close()
         Base.metadata.drop_all(self.engine)
         self.engine.dispose()
 
+class TestGameLoaderSQLite(unittest.TestCase):
+    # Loads a recorded game, served by the local GameDay stand-in, into
+    # SQLite
+    def setUp(self):
+        self.server = GameDayServer(FIXTURES, port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.gameday_url = config.GAMEDAY_URL
+        config.GAMEDAY_URL = self.server.url
+        self.engine = get_backend('sqlite://').create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.sessionmaker = sessionmaker(bind=self.engine)
+        # The fresh database has none of the players this process cached
+        players.forget()
+        GameLoader('gid_2015_05_09_cinmlb_chamlb_1', self.sessionmaker).load()
+
+    def test_game_loaded(self):
+        s = self.sessionmaker()
+        game = s.query(Game).one()
+        self.assertEqual(game.status, 'Final')
+        self.assertEqual(game.home_team_runs, 2)
+        self.assertEqual(s.query(Pitch).count(), 6)
+        self.assertEqual(s.query(Player).get(477132).full_name, 'Chris Sale')
+        s.close()
+
+    def test_pitching_decisions(self):
+        s = self.sessionmaker()
+        decisions = dict((p.pitcher_id, (p.win, p.loss, p.save))
+                         for p in s.query(Pitcher))
+        self.assertEqual(decisions, {477132: (True, False, False),
+                                     456501: (False, True, False),
+                                     462136: (False, False, True)})
+        s.close()
+
+    def tearDown(self):
+        config.GAMEDAY_URL = self.gameday_url
+        self.server.shutdown()
+        self.server.server_close()
+        self.engine.dispose()
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from dbtest import SQLiteTestCase
+from matchups import outcome_counts, update_matchups, get_matchup
+
+
+class TestMatchups(SQLiteTestCase):
+    def test_outcome_counts(self):
+        counts = outcome_counts('Home Run')
+        self.assertEqual((counts['plate_appearances'], counts['at_bats'],
+                          counts['hits'], counts['home_runs']), (1, 1, 1, 1))
+        counts = outcome_counts('Walk')
+        self.assertEqual((counts['plate_appearances'], counts['at_bats'],
+                          counts['walks']), (1, 0, 1))
+        self.assertIsNone(outcome_counts(''))
+        self.assertIsNone(outcome_counts('Caught Stealing 2B'))
+
+    def test_update_matchups_is_incremental(self):
+        gid = 'gid_2015_05_09_cinmlb_chamlb_1'
+        at_bats = [(1, 20, 10, 'Strikeout'), (2, 21, 10, 'Single'),
+                   (3, 20, 10, '')]
+        pitches = [(1, 'FF', 'S', 'Swinging Strike', 95.0),
+                   (1, 'FF', 'S', 'Called Strike', 96.0),
+                   (1, 'SL', 'S', 'Swinging Strike (Blocked)', 85.0),
+                   (2, 'FF', 'X', 'In play, no out', 94.0),
+                   (3, 'CH', 'B', 'Ball', 86.0)]
+        update_matchups(self.session, gid, at_bats, pitches)
+        self.session.commit()
+        # Reloading the game only adds the at-bat completed since
+        at_bats[2] = (3, 20, 10, 'Walk')
+        pitches += [(3, 'CH', 'B', 'Ball', None)]
+        update_matchups(self.session, gid, at_bats, pitches)
+        self.session.commit()
+
+        matchup = get_matchup(self.session, 20, 10)
+        self.assertEqual(matchup['plate_appearances'], 2)
+        self.assertEqual(matchup['at_bats'], 1)
+        self.assertEqual(matchup['strikeouts'], 1)
+        self.assertEqual(matchup['walks'], 1)
+        self.assertEqual(matchup['pitch_types']['FF']['pitches'], 2)
+        self.assertEqual(matchup['pitch_types']['FF']['whiffs'], 1)
+        self.assertEqual(matchup['pitch_types']['FF']['avg_speed'], 95.5)
+        self.assertEqual(matchup['pitch_types']['SL']['whiffs'], 1)
+        self.assertEqual(matchup['pitch_types']['CH']['balls'], 2)
+        self.assertEqual(matchup['pitch_types']['CH']['avg_speed'], 86.0)
+        self.assertEqual(get_matchup(self.session, 21, 10)['hits'], 1)
+        self.assertEqual(get_matchup(self.session, 22, 10)['pitch_types'], {})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import datetime as dt
+import os
+import queue
+import tempfile
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Game, AtBat
+from notify import GameUpdates, publish
+
+GID = 'gid_2015_05_09_cinmlb_chamlb_1'
+
+
+class TestNotify(unittest.TestCase):
+    def setUp(self):
+        # A file, so the listening thread's connections see the same database
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.engine = create_engine('sqlite:///' + self.path)
+        Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        session = self.Session()
+        session.add(Game(game_id=GID, game_date=dt.date(2015, 5, 9),
+                         season=2015, url='', status='In Progress',
+                         home_team_runs=0, away_team_runs=0))
+        session.add(AtBat(game_id=GID, at_bat_number=1, event='Single'))
+        session.commit()
+        session.close()
+        self.updates = GameUpdates(self.Session, timeout=0.1)
+
+    def load(self, at_bats, home_team_runs, notify=True):
+        # Write rows and publish, as GameLoader.write does
+        session = self.Session()
+        session.query(Game).filter(Game.game_id == GID).update(
+            {'home_team_runs': home_team_runs})
+        for at_bat in at_bats:
+            session.merge(at_bat)
+        if notify:
+            publish(session, GID)
+        session.commit()
+        session.close()
+
+    def test_pushes_new_at_bats(self):
+        first = self.updates.subscribe(GID)
+        second = self.updates.subscribe(GID)
+        # Each subscriber starts with the game's current state
+        for updates in (first, second):
+            update = updates.get(timeout=5)
+            self.assertEqual(update['status'], 'In Progress')
+            self.assertEqual([a['at_bat_number'] for a in update['at_bats']],
+                             [1])
+        self.load([AtBat(game_id=GID, at_bat_number=2, event='Home Run'),
+                   AtBat(game_id=GID, at_bat_number=3, event='')], 1)
+        for updates in (first, second):
+            update = updates.get(timeout=5)
+            self.assertEqual(update['home_team_runs'], 1)
+            self.assertEqual([a['at_bat_number'] for a in update['at_bats']],
+                             [2])
+        # Completing the at-bat in progress pushes just that at-bat
+        self.load([AtBat(game_id=GID, at_bat_number=3, event='Walk')], 1)
+        update = first.get(timeout=5)
+        self.assertEqual([a['at_bat_number'] for a in update['at_bats']], [3])
+        # A later viewer starts with every at-bat pushed so far
+        third = self.updates.subscribe(GID)
+        update = third.get(timeout=5)
+        self.assertEqual(update['home_team_runs'], 1)
+        self.assertEqual([a['at_bat_number'] for a in update['at_bats']],
+                         [1, 2, 3])
+
+    def test_unchanged_game_pushes_nothing(self):
+        updates = self.updates.subscribe(GID)
+        updates.get(timeout=5)
+        self.load([], 0)
+        self.load([], 2)
+        # Only the second load changed the game
+        self.assertEqual(updates.get(timeout=5)['home_team_runs'], 2)
+        self.assertTrue(updates.empty())
+
+    def test_load_during_first_read(self):
+        # A game loaded while its first viewer reads its state is pushed,
+        # and the read doesn't hold the lock
+        read = self.updates._read
+        locked = []
+
+        def read_then_load(game_id, after):
+            update = read(game_id, after)
+            if after is None:
+                locked.append(self.updates._lock.locked())
+                self.load([AtBat(game_id=GID, at_bat_number=2,
+                                 event='Home Run')], 1)
+            return update
+
+        self.updates._read = read_then_load
+        updates = self.updates.subscribe(GID)
+        self.assertEqual(locked, [False])
+        self.assertEqual([a['at_bat_number'] for a in
+                          updates.get(timeout=5)['at_bats']], [1])
+        update = updates.get(timeout=5)
+        self.assertEqual([a['at_bat_number'] for a in update['at_bats']], [2])
+        # The listening thread's push of the same load doesn't repeat it
+        self.load([], 1)
+        self.assertRaises(queue.Empty, updates.get, timeout=0.5)
+
+    def test_overlapping_pushes(self):
+        # A push that read newer rows than an overlapping push that stored
+        # its update first reads again, rather than dropping its rows
+        updates = self.updates.subscribe(GID)
+        updates.get(timeout=5)
+        read = self.updates._read
+        reads = []
+
+        def overlapping_read(game_id, after):
+            reads.append(after)
+            if len(reads) == 1:
+                self.load([], 1, notify=False)
+                self.updates._push(GID)
+                self.load([AtBat(game_id=GID, at_bat_number=2,
+                                 event='Home Run')], 1, notify=False)
+            return read(game_id, after)
+
+        self.updates._read = overlapping_read
+        self.updates._push(GID)
+        self.assertEqual(updates.get(timeout=5)['at_bats'], [])
+        update = updates.get(timeout=5)
+        self.assertEqual([a['at_bat_number'] for a in update['at_bats']], [2])
+        self.assertTrue(updates.empty())
+
+    def tearDown(self):
+        self.updates.close()
+        self.engine.dispose()
+        os.remove(self.path)
+
+if __name__ == "__main__":
+    unittest.main()
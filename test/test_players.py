@@ -0,0 +1,118 @@
+import datetime as dt
+import unittest
+from sqlalchemy.orm import sessionmaker
+from backends import get_backend
+from models import Base, Player, PlayerName, Batter
+import players
+
+
+class TestPlayers(unittest.TestCase):
+    def setUp(self):
+        players.forget()
+
+    def test_player_tables(self):
+        game_date = dt.date(2015, 5, 9)
+        tables = [(Player.__table__,
+                   [(545361, 'Trout', 'Mike Trout', game_date),
+                    (545361, 'Trout', 'Mike Trout', game_date),
+                    (453286, 'Scherzer', 'Max Scherzer', game_date)]),
+                  (Batter.__table__, [])]
+        out, new = players.player_tables(tables)
+        self.assertEqual([t for t, _ in out], [Player.__table__,
+                                               PlayerName.__table__,
+                                               Batter.__table__])
+        self.assertEqual(sorted(new[0]),
+                         [(453286, 'Scherzer', 'Max Scherzer', game_date),
+                          (545361, 'Trout', 'Mike Trout', game_date)])
+        self.assertIn((545361, 'Trout', 'Mike Trout', game_date), out[1][1])
+
+        # Once remembered, players are only written again if their names
+        # change in a later game
+        players.remember(new)
+        later = dt.date(2015, 5, 10)
+        tables[0] = (Player.__table__,
+                     [(545361, 'Trout', 'Mike Trout', later),
+                      (453286, 'Scherzer', 'Maxwell', later)])
+        out, new = players.player_tables(tables)
+        self.assertEqual(new, ([(453286, 'Scherzer', 'Maxwell', later)],
+                               [(453286, 'Scherzer', 'Maxwell', later)]))
+
+    def test_out_of_order(self):
+        later = dt.date(2016, 5, 9)
+        earlier = dt.date(2015, 5, 9)
+        players.remember(players.player_tables(
+            [(Player.__table__, [(545361, 'Trout', 'Mike Trout', later)])])[1])
+        # An earlier game doesn't replace the player's names, but records
+        # the earlier date of the names
+        out, new = players.player_tables(
+            [(Player.__table__, [(545361, 'Trout', 'Michael Trout', earlier),
+                                 (453286, 'Scherzer', 'Max', earlier)])])
+        self.assertEqual(new[0], [(453286, 'Scherzer', 'Max', earlier)])
+        self.assertEqual(sorted(new[1]),
+                         [(453286, 'Scherzer', 'Max', earlier),
+                          (545361, 'Trout', 'Michael Trout', earlier)])
+        players.remember(new)
+        out, new = players.player_tables(
+            [(Player.__table__, [(545361, 'Trout', 'Mike Trout', earlier)])])
+        self.assertEqual(new, ([], [(545361, 'Trout', 'Mike Trout',
+                                     earlier)]))
+
+    def test_in_order(self):
+        # Loading games in date order writes each player once
+        for day in range(1, 31):
+            rows = [(545361, 'Trout', 'Mike Trout', dt.date(2015, 5, day))]
+            out, new = players.player_tables([(Player.__table__, rows)])
+            self.assertEqual(len(new[0]), 1 if day == 1 else 0)
+            players.remember(new)
+
+    def tearDown(self):
+        players.forget()
+
+
+class TestPlayerTablesSQLite(unittest.TestCase):
+    # Games loaded out of order keep the most recent names and the earliest
+    # date of each name
+    def setUp(self):
+        self.backend = get_backend('sqlite://')
+        self.engine = self.backend.create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.sessionmaker = sessionmaker(bind=self.engine)
+
+    def write(self, rows):
+        # Write a game's players rows, bypassing the cache
+        with self.engine.begin() as conn:
+            self.backend.upsert(conn, Player.__table__, rows)
+            self.backend.upsert(conn, PlayerName.__table__, rows)
+
+    def test_out_of_order(self):
+        self.write([(545361, 'Trout', 'Mike Trout', dt.date(2016, 5, 9))])
+        self.write([(545361, 'Trout', 'Michael Trout', dt.date(2015, 5, 9))])
+        self.write([(545361, 'Trout', 'Mike Trout', dt.date(2015, 9, 9))])
+        s = self.sessionmaker()
+        player = s.query(Player).one()
+        self.assertEqual((player.full_name, player.names_since),
+                         ('Mike Trout', dt.date(2016, 5, 9)))
+        names = dict((n.full_name, n.first_game_date)
+                     for n in s.query(PlayerName))
+        self.assertEqual(names, {'Michael Trout': dt.date(2015, 5, 9),
+                                 'Mike Trout': dt.date(2015, 9, 9)})
+        s.close()
+
+    def test_name_change(self):
+        # Unchanged names keep the date they were first seen; new names in a
+        # later game replace them
+        self.write([(545361, 'Trout', 'Mike Trout', dt.date(2015, 5, 9))])
+        self.write([(545361, 'Trout', 'Mike Trout', dt.date(2015, 6, 9))])
+        self.write([(545361, 'Trout', 'Michael Trout', dt.date(2015, 7, 9))])
+        s = self.sessionmaker()
+        player = s.query(Player).one()
+        self.assertEqual((player.full_name, player.names_since),
+                         ('Michael Trout', dt.date(2015, 7, 9)))
+        s.close()
+
+    def tearDown(self):
+        self.engine.dispose()
+
+
+if __name__ == "__main__":
+    unittest.main()
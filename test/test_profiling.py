@@ -0,0 +1,62 @@
+import cProfile
+import os
+import shutil
+import tempfile
+import unittest
+from profiling import should_profile, profiled, find_dumps, aggregate
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+
+    def test_should_profile(self):
+        gid = 'gid_2015_05_09_cinmlb_chamlb_1'
+        self.assertTrue(should_profile(gid, rate=1.0, pattern=None))
+        self.assertFalse(should_profile(gid, rate=0.0, pattern=None))
+        self.assertTrue(should_profile(gid, rate=1.0, pattern='cinmlb'))
+        self.assertFalse(should_profile(gid, rate=1.0, pattern='nyamlb'))
+
+    def test_profiled_dumps_and_aggregates(self):
+        gids = ['gid_2015_05_09_cinmlb_chamlb_1',
+                'gid_2015_05_09_balmlb_nyamlb_1']
+        for gid in gids:
+            for stage in ('fetch', 'parse'):
+                with profiled(gid, stage, profile_dir=self.profile_dir):
+                    sum(range(1000))
+        self.assertEqual(len(os.listdir(self.profile_dir)), 4)
+        parse_dumps = find_dumps(self.profile_dir, stage='parse')
+        self.assertEqual(len(parse_dumps), 2)
+        self.assertEqual(len(find_dumps(self.profile_dir, game_pattern='nya')),
+                         2)
+        stats = aggregate(parse_dumps)
+        self.assertTrue(stats.total_calls > 0)
+
+    def test_concurrent_blocks_run_unprofiled(self):
+        # Only one block is profiled at a time; the others still run
+        gid = 'gid_2015_05_09_cinmlb_chamlb_1'
+        ran = []
+        with profiled(gid, 'fetch', profile_dir=self.profile_dir):
+            with profiled(gid, 'parse', profile_dir=self.profile_dir):
+                ran.append('parse')
+        self.assertEqual(ran, ['parse'])
+        self.assertEqual(len(find_dumps(self.profile_dir, stage='fetch')), 1)
+        self.assertEqual(find_dumps(self.profile_dir, stage='parse'), [])
+
+    def test_active_profiler_runs_unprofiled(self):
+        # A profiler started outside profiled() doesn't fail the block
+        gid = 'gid_2015_05_09_cinmlb_chamlb_1'
+        other = cProfile.Profile()
+        other.enable()
+        try:
+            with profiled(gid, 'parse', profile_dir=self.profile_dir):
+                ran = True
+        finally:
+            other.disable()
+        self.assertTrue(ran)
+
+    def tearDown(self):
+        shutil.rmtree(self.profile_dir)
+
+if __name__ == "__main__":
+    unittest.main()
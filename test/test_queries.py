@@ -0,0 +1,57 @@
+import datetime as dt
+import unittest
+import numpy as np
+from dbtest import SQLiteTestCase
+from models import Game, AtBat, Pitch
+from queries import stream_pitches, stream_at_bats
+
+
+class TestQueries(SQLiteTestCase):
+    def setUp(self):
+        super().setUp()
+        session = self.session
+        session.add(Game(game_id='gid_2015_05_09_cinmlb_chamlb_1',
+                         game_date=dt.date(2015, 5, 9), season=2015,
+                         home_team_id=145, away_team_id=113, url=''))
+        session.add(AtBat(game_id='gid_2015_05_09_cinmlb_chamlb_1',
+                          at_bat_number=1, batter_id=1, pitcher_id=2))
+        session.add(AtBat(game_id='gid_2015_05_09_cinmlb_chamlb_1',
+                          at_bat_number=2, batter_id=3, pitcher_id=2))
+        for pitch_id, at_bat_number, pitch_type, x in [(1, 1, 'FF', 100.5),
+                                                       (2, 1, 'SL', None),
+                                                       (3, 2, 'FF', 80.0)]:
+            session.add(Pitch(game_id='gid_2015_05_09_cinmlb_chamlb_1',
+                              pitch_id=pitch_id, at_bat_number=at_bat_number,
+                              pitch_type=pitch_type, x=x))
+        session.commit()
+
+    def test_stream_pitches_in_chunks(self):
+        chunks = list(stream_pitches(columns=['pitch_id', 'x', 'batter_id'],
+                                     bind=self.engine, chunk_size=2,
+                                     season=2015))
+        self.assertEqual([len(c['pitch_id']) for c in chunks], [2, 1])
+        self.assertEqual(chunks[0]['pitch_id'].dtype, np.int64)
+        self.assertTrue(np.isnan(chunks[0]['x'][1]))
+        self.assertEqual(list(chunks[1]['batter_id']), [3.0])
+
+    def test_stream_pitches_filters(self):
+        chunks = list(stream_pitches(bind=self.engine, as_records=True,
+                                     pitch_type='FF', batter_id=[1, 5]))
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(list(chunks[0].pitch_id), [1])
+        self.assertEqual(list(stream_pitches(bind=self.engine, season=2014)),
+                         [])
+
+    def test_stream_at_bats(self):
+        chunks = list(stream_at_bats(bind=self.engine, pitch_type='SL',
+                                     team_id=113))
+        self.assertEqual(list(chunks[0]['at_bat_number']), [1])
+        self.assertEqual(chunks[0]['game_date'][0],
+                         np.datetime64('2015-05-09'))
+
+    def test_unknown_column(self):
+        with self.assertRaises(ValueError):
+            stream_pitches(columns=['nope'], bind=self.engine)
+
+if __name__ == "__main__":
+    unittest.main()
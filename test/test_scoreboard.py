@@ -0,0 +1,112 @@
+import datetime as dt
+import os
+import sys
+import threading
+import unittest
+from sqlalchemy.orm import sessionmaker
+import config
+import db
+from backends import get_backend
+from gameloader import GameLoader
+import players
+from load import changed_games
+from models import Base, Game
+from scoreboard import GameState, parse_scoreboard, games_to_load, not_final
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+from gameday_server import GameDayServer  # noqa: E402
+
+FIXTURES = os.path.join(ROOT, 'test', 'fixtures', 'gameday')
+
+SCOREBOARD = b"""<?xml version="1.0" encoding="UTF-8"?>
+<games year="2015" month="05" day="09">
+  <game id="2015/05/09/anamlb-houmlb-1" gameday="2015_05_09_anamlb_houmlb_1">
+    <status status="Final" inning="9" top_inning="N"/>
+  </game>
+  <game id="2015/05/09/bosmlb-tormlb-1" gameday="2015_05_09_bosmlb_tormlb_1">
+    <status status="In Progress" inning="4" top_inning="Y"/>
+  </game>
+  <game id="2015/05/09/chamlb-detmlb-1" gameday="2015_05_09_chamlb_detmlb_1">
+    <status status="Preview" inning="" top_inning=""/>
+  </game>
+</games>
+"""
+
+FINAL = 'gid_2015_05_09_anamlb_houmlb_1'
+LIVE = 'gid_2015_05_09_bosmlb_tormlb_1'
+PREVIEW = 'gid_2015_05_09_chamlb_detmlb_1'
+
+
+class TestScoreboard(unittest.TestCase):
+    def test_parse_scoreboard(self):
+        games = parse_scoreboard(SCOREBOARD)
+        self.assertEqual(games[FINAL], GameState('Final', 9, False))
+        self.assertEqual(games[LIVE], GameState('In Progress', 4, True))
+        self.assertEqual(games[PREVIEW], GameState('Preview', None, False))
+
+    def test_parse_miniscoreboard(self):
+        xml = b"""<games><game gameday_link="2015_05_09_anamlb_houmlb_1"
+            status="Final" inning="9" top_inning="N"/></games>"""
+        self.assertEqual(parse_scoreboard(xml),
+                         {FINAL: GameState('Final', 9, False)})
+
+    def test_games_to_load(self):
+        games = parse_scoreboard(SCOREBOARD)
+        stored = {FINAL: GameState('Final', 9, False),
+                  LIVE: GameState('In Progress', 3, False)}
+        # Unchanged games are skipped; changed and new games are loaded
+        self.assertEqual(games_to_load(games, stored), [LIVE, PREVIEW])
+        stored[LIVE] = games[LIVE]
+        stored[PREVIEW] = games[PREVIEW]
+        self.assertEqual(games_to_load(games, stored), [])
+
+    def test_not_final(self):
+        stored = {FINAL: GameState('Final', 9, False),
+                  LIVE: GameState('In Progress', 3, False)}
+        self.assertEqual(not_final([FINAL, LIVE, PREVIEW], stored),
+                         [LIVE, PREVIEW])
+
+
+
+class TestChangedGames(unittest.TestCase):
+    # The dispatcher's choice of games, against the recorded scoreboard of a
+    # day with a final game and one that hasn't started
+    def setUp(self):
+        self.server = GameDayServer(FIXTURES, port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.gameday_url = config.GAMEDAY_URL
+        config.GAMEDAY_URL = self.server.url
+        self.engine = get_backend('sqlite://').create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.sessionmaker = sessionmaker(bind=self.engine)
+        # The fresh database has none of the players this process cached
+        players.forget()
+        db.Session.configure(bind=self.engine)
+        self.date = dt.datetime(2015, 5, 9)
+
+    def test_loaded_games_are_not_sent_again(self):
+        game_ids = changed_games(self.date)
+        self.assertEqual(game_ids, ['gid_2015_05_09_anamlb_houmlb_1',
+                                    'gid_2015_05_09_cinmlb_chamlb_1'])
+        for gid in game_ids:
+            GameLoader(gid, self.sessionmaker).load()
+        # The game in Preview has no boxscore yet, but its game row is
+        # stored with the scoreboard's status
+        session = self.sessionmaker()
+        self.assertEqual(session.query(Game.status).filter(
+            Game.game_id == 'gid_2015_05_09_anamlb_houmlb_1').scalar(),
+            'Preview')
+        session.close()
+        self.assertEqual(changed_games(self.date), [])
+
+    def tearDown(self):
+        db.Session.configure(bind=None)
+        config.GAMEDAY_URL = self.gameday_url
+        self.server.shutdown()
+        self.server.server_close()
+        self.engine.dispose()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import datetime as dt
+import unittest
+from sqlalchemy.dialects import postgresql
+from backends import PostgreSQLBackend
+from dbtest import SQLiteTestCase
+from models import Game, AtBat, Pitch
+from search import search_plays, create_indexes, format_cursor, \
+    parse_cursor
+
+
+class TestSearch(SQLiteTestCase):
+    def setUp(self):
+        super().setUp()
+        for day in (9, 10):
+            gid = 'gid_2015_05_{}_cinmlb_chamlb_1'.format(day)
+            self.session.add(Game(game_id=gid, game_date=dt.date(2015, 5, day),
+                                  season=2015, url=''))
+            self.session.add(AtBat(
+                game_id=gid, at_bat_number=1, event='Home Run',
+                description='Todd Frazier homers (7) on a fly ball. '
+                            'Grand slam.'))
+            self.session.add(AtBat(game_id=gid, at_bat_number=2,
+                                   event='Strikeout',
+                                   description='Jay Bruce strikes out.'))
+            self.session.add(Pitch(game_id=gid, pitch_id=3, at_bat_number=2,
+                                   description='Swinging Strike'))
+        self.session.commit()
+
+    def test_search_at_bats(self):
+        plays, after = search_plays(self.session, 'GRAND slam')
+        self.assertEqual([p['game_id'] for p in plays],
+                         ['gid_2015_05_10_cinmlb_chamlb_1',
+                          'gid_2015_05_9_cinmlb_chamlb_1'])
+        self.assertIsNone(after)
+        # Words can match either the event or the description
+        plays, _ = search_plays(self.session, 'home slam')
+        self.assertEqual(len(plays), 2)
+        plays, _ = search_plays(self.session, 'grand out')
+        self.assertEqual(plays, [])
+
+    def test_search_pagination(self):
+        plays, after = search_plays(self.session, 'slam', per_page=1)
+        self.assertEqual(plays[0]['game_date'], dt.date(2015, 5, 10))
+        self.assertEqual(after, (dt.date(2015, 5, 10),
+                                 'gid_2015_05_10_cinmlb_chamlb_1', 1))
+        plays, after = search_plays(self.session, 'slam', after=after,
+                                    per_page=1)
+        self.assertEqual(plays[0]['game_date'], dt.date(2015, 5, 9))
+        self.assertIsNone(after)
+
+    def test_pitches_pagination(self):
+        # Pages of pitches continue within a game after the cursor's pitch
+        gid = 'gid_2015_05_10_cinmlb_chamlb_1'
+        self.session.add(Pitch(game_id=gid, pitch_id=4, at_bat_number=2,
+                               description='Swinging Strike (Blocked)'))
+        self.session.commit()
+        plays, after = search_plays(self.session, 'swinging', kind='pitches',
+                                    per_page=1)
+        self.assertEqual(after, (dt.date(2015, 5, 10), gid, 3))
+        plays, after = search_plays(self.session, 'swinging', kind='pitches',
+                                    after=after, per_page=1)
+        self.assertEqual((plays[0]['game_id'], plays[0]['pitch_id']),
+                         (gid, 4))
+        plays, after = search_plays(self.session, 'swinging', kind='pitches',
+                                    after=after, per_page=1)
+        self.assertEqual(plays[0]['game_date'], dt.date(2015, 5, 9))
+        self.assertIsNone(after)
+
+    def test_cursor(self):
+        cursor = (dt.date(2015, 5, 9), 'gid_2015_05_09_cinmlb_chamlb_1', 12)
+        self.assertEqual(parse_cursor(format_cursor(cursor)), cursor)
+        self.assertRaises(ValueError, parse_cursor, '2015-05-09,gid')
+        self.assertRaises(ValueError, parse_cursor, 'x,gid,12')
+
+    def test_search_pitches(self):
+        plays, _ = search_plays(self.session, 'swinging', kind='pitches')
+        self.assertEqual(len(plays), 2)
+        self.assertEqual(plays[0]['event'], 'Strikeout')
+        self.assertRaises(ValueError, search_plays, self.session, 'x',
+                          kind='runners')
+
+    def test_postgresql_uses_index_expression(self):
+        # The query's document must match the index's for it to be used
+        backend = PostgreSQLBackend()
+        columns = [AtBat.__table__.c.event, AtBat.__table__.c.description]
+        clause = str(backend.text_search(columns, 'grand slam').compile(
+            dialect=postgresql.dialect()))
+        ddl = backend.text_search_indexes(AtBat.__table__, columns)[0]
+        document = "to_tsvector('english', {0}event || ' ' || {0}description)"
+        self.assertIn(document.format('at_bats.'), clause)
+        self.assertIn(document.format(''), ddl)
+        self.assertEqual(create_indexes(self.engine), 0)
+
+if __name__ == "__main__":
+    unittest.main()
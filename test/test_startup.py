@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def modules_after_import(module):
+    # Import in a fresh interpreter, so modules imported by other tests don't
+    # leak into the result
+    script = 'import sys, {}; print(" ".join(sys.modules))'.format(module)
+    out = subprocess.check_output([sys.executable, '-c', script], cwd=ROOT)
+    return set(out.decode().split())
+
+
+class TestStartup(unittest.TestCase):
+    def test_dispatcher_imports(self):
+        # Only modules the repo controls: celery imports dateutil or pytz
+        # itself
+        modules = modules_after_import('load')
+        for heavy in ('gameloader', 'bs4', 'sqlalchemy', 'models', 'db'):
+            self.assertNotIn(heavy, modules)
+
+    def test_web_imports(self):
+        modules = modules_after_import('app')
+        for heavy in ('gameloader', 'celery', 'bs4', 'requests', 'numpy'):
+            self.assertNotIn(heavy, modules)
+
+    def test_db_import_creates_no_engine(self):
+        import db
+        self.assertIsNone(db._engine)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,7 @@
 import datetime as dt
 from urllib.parse import urljoin
-from bs4 import BeautifulSoup
-import requests
 import re
+import config
 
 
 def try_int(x):
@@ -22,6 +21,11 @@ def try_float(x):
 
 
 def fetch_game_listings(date):
+    # Imported here so that modules needing only the helpers above (e.g.,
+    # models.py) don't pull in requests and BeautifulSoup
+    from bs4 import BeautifulSoup
+    import requests
+
     date_url = date_to_url(date)
     request = requests.get(date_url)
     try:
@@ -49,7 +53,7 @@ def gid_to_url(game_id):
 
 
 def date_to_url(game_date):
-    base_url = "http://gd2.mlb.com/components/game/mlb/"
+    base_url = config.GAMEDAY_URL
     date_pattern = "year_{0:04}/month_{1:02}/day_{2:02}/".format(
         game_date.year, game_date.month, game_date.day)
     date_url = urljoin(base_url, date_pattern)